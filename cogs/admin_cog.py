@@ -9,6 +9,10 @@ import discord
 from discord.ext import commands, tasks
 
 from .utils.common import CommonUtil
+from .utils.db import db_config
+from .utils.setting_cache import keep_all_cache, notify_role_cache
+from .utils.task_supervisor import task_supervisor
+from .utils.thread_pipeline import thread_creation
 
 
 class Admin(commands.Cog, name="管理用コマンド群"):
@@ -28,6 +32,11 @@ class Admin(commands.Cog, name="管理用コマンド群"):
 
         self.auto_backup.stop()
         self.auto_backup.start()
+        task_supervisor.watch("auto_backup", self.auto_backup, stale_after=300)
+
+    async def cog_unload(self):
+        task_supervisor.unwatch("auto_backup")
+        self.auto_backup.cancel()
 
     async def cog_check(self, ctx) -> bool:
         """管理者のみがコマンドを実行できるようにするチェック"""
@@ -48,6 +57,9 @@ class Admin(commands.Cog, name="管理用コマンド群"):
             destination: 送信先（ctx または channel）
         """
         try:
+            # WALに残っている更新をデータベースファイルへ書き戻す
+            await db_config.checkpoint()
+
             # データベースファイルを送信
             data_files = self.get_data_files()
             if data_files:
@@ -127,6 +139,58 @@ class Admin(commands.Cog, name="管理用コマンド群"):
         server_names = '\n'.join(server_list) if server_list else "参加しているサーバーがありません"
         await ctx.reply(f"現在入っているサーバーは以下の通りです\n{server_names}", mention_author=False)
 
+    @commands.command(hidden=True)
+    async def cache(self, ctx):
+        """設定キャッシュのヒット率を表示するコマンド"""
+        lines = []
+        for stats in (keep_all_cache.stats(), notify_role_cache.stats()):
+            lines.append(
+                f"{stats.name}: {stats.size}件 hit {stats.hits} / miss {stats.misses} "
+                f"({stats.hit_rate:.1%})"
+            )
+        await ctx.reply("\n".join(lines), mention_author=False)
+
+    @commands.command(hidden=True)
+    async def pipeline(self, ctx):
+        """スレッド作成パイプラインのステージごとの所要時間と待ち行列を表示するコマンド"""
+        lines = [
+            f"{stats.name}: {stats.runs}回 平均{stats.average_ms:.0f}ms "
+            f"最大{stats.max_ms:.0f}ms 失敗{stats.failures} スキップ{stats.skipped}"
+            for stats in thread_creation.stats()
+        ]
+        admission = thread_creation.admission_stats()
+        lines.append(
+            f"待ち行列: 待機{admission.waiting} 実行中{admission.in_flight} "
+            f"累計{admission.admitted} 省略{admission.shed} 後回し{admission.deferred}"
+        )
+        await ctx.reply("\n".join(lines) or "ステージがありません", mention_author=False)
+
+    @commands.command(hidden=True)
+    async def supervisor(self, ctx):
+        """バックグラウンドループの稼働状況と再起動回数を表示するコマンド"""
+        lines = [
+            f"{stats.name}: {'稼働中' if stats.running else '停止中'} "
+            f"再起動{stats.restarts}回 "
+            + (
+                f"最終周回{stats.seconds_since_heartbeat:.0f}秒前"
+                if stats.seconds_since_heartbeat is not None
+                else "未周回"
+            )
+            + (f" 最後のエラー: {stats.last_error}" if stats.last_error else "")
+            for stats in task_supervisor.stats()
+        ]
+        await ctx.reply("\n".join(lines) or "監視中のループがありません", mention_author=False)
+
+    @commands.command(hidden=True)
+    async def vacuum(self, ctx):
+        """既存のDBのauto_vacuumをINCREMENTALに切り替えるコマンド"""
+        async with ctx.typing():
+            switched = await db_config.enable_incremental_vacuum()
+        if switched:
+            await ctx.reply("auto_vacuumをINCREMENTALに切り替えました", mention_author=False)
+        else:
+            await ctx.reply("auto_vacuumは既にINCREMENTALです", mention_author=False)
+
     @commands.command(hidden=True)
     async def back_up(self, ctx):
         """手動バックアップコマンド"""
@@ -2,12 +2,17 @@
 リマインド除外設定管理用のDiscordコマンド
 """
 
-import asyncio
 import discord
 from discord import app_commands, ui
 from discord.ext import commands
 
-from .utils.reminder_exclusions import ReminderExclusionManager
+from .utils.migrations import migrate
+from .utils.reminder_exclusions import (
+    ReminderExclusion,
+    ReminderExclusionManager,
+    exclusion_index,
+)
+from .utils.thread_pipeline import CreationContext, thread_creation
 
 
 class ReminderExclusionCog(commands.Cog, name="リマインド除外管理"):
@@ -16,10 +21,21 @@ class ReminderExclusionCog(commands.Cog, name="リマインド除外管理"):
     def __init__(self, bot):
         self.bot = bot
         self.reminder_exclusions = ReminderExclusionManager()
+        self._bootstrapped = False
 
         # Cog初期化時に永続化Viewを追加（ボット再起動時のため）
         self.setup_persistent_views()
 
+        # スレッド作成時の処理はThreadKeeperのパイプラインで実行する
+        thread_creation.register("reminder_owner", self._stage_reminder_owner)
+        # スレッド作成直後は送信失敗しやすいので参加後に送る
+        thread_creation.register(
+            "reminder_button", self._stage_reminder_button, after=("join",)
+        )
+
+    async def cog_unload(self):
+        thread_creation.unregister("reminder_owner", "reminder_button")
+
     def setup_persistent_views(self):
         """永続化ビューをセットアップ"""
         # 既存のビューを確認して重複登録を防ぐ
@@ -31,36 +47,43 @@ class ReminderExclusionCog(commands.Cog, name="リマインド除外管理"):
 
     @commands.Cog.listener()
     async def on_ready(self):
-        """on_ready時にテーブルを作成とViewの永続化登録"""
-        await self.reminder_exclusions.create_table()
+        """on_ready時にスキーマの更新とViewの永続化登録（再接続時は何もしない）"""
+        if self._bootstrapped:
+            return
+        self._bootstrapped = True
+
+        await migrate()
+        await self.reminder_exclusions.load_index()
 
         # 永続化Viewを登録（重複チェック済み）
         self.setup_persistent_views()
 
-    @commands.Cog.listener()
-    async def on_thread_create(self, thread: discord.Thread):
-        """スレッド作成時にオーナーをDBに追加し、管理者専用のユーザー追加ボタンを送信"""
-        if not thread.guild:
+    async def _stage_reminder_owner(self, ctx: CreationContext):
+        """スレッド作成時にオーナーをDBに追加（パイプラインの最後にまとめてコミット）"""
+        thread = ctx.thread
+        if not thread.owner_id:
             return
 
-        try:
-            # スレッドオーナーをDBに自動追加
-            if thread.owner_id:
-                await self.reminder_exclusions.add_exclusion(
-                    channel_id=thread.id,
-                    guild_id=thread.guild.id,
-                    exclude_type="thread",
-                    exclude_children=False,
-                    reminder_weeks=4,  # デフォルトは4週間
-                    roles=[thread.owner_id],
-                )
+        exclusion = ReminderExclusion(
+            channel_id=thread.id,
+            guild_id=thread.guild.id,
+            exclude_type="thread",
+            exclude_children=False,
+            reminder_weeks=4,  # デフォルトは4週間
+            roles=[thread.owner_id],
+        )
+        ctx.write(
+            self.reminder_exclusions.build_add_exclusion(exclusion),
+            after_commit=lambda: exclusion_index.put(exclusion),
+        )
 
+    async def _stage_reminder_button(self, ctx: CreationContext):
+        """管理者専用のユーザー追加ボタンを送信"""
+        try:
             # ViewとUIを作成
             view = PersistentAddRolesView(self.reminder_exclusions)
 
-            # スレッド作成直後は送信失敗しやすいので少し待つ
-            await asyncio.sleep(1)
-            await thread.send(
+            await ctx.thread.send(
                 "リマインド対象ユーザーを追加/変更する場合は下のボタンを押してください",
                 view=view,
             )
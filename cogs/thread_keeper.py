@@ -11,14 +11,24 @@ import discord
 from discord import app_commands
 from discord.ext import commands, tasks
 
+from .utils.command_sync import sync_if_changed
 from .utils.common import CommonUtil
+from .utils.edit_coalescer import thread_edits
 from .utils.guild_setting import GuildSettingManager
+from .utils.migrations import migrate
 from .utils.notify_role import NotifySettingManager
-from .utils.scheduled_closures import ScheduledClosureManager
-from .utils.thread_channels import ChannelDataManager
+from .utils.rate_limiter import Lane, rate_limiter
+from .utils.retention import retention_engine
+from .utils.scheduled_closures import ScheduledClosureManager, closure_deadlines
+from .utils.setting_cache import keep_all_cache
+from .utils.task_supervisor import task_supervisor
+from .utils.thread_activity import ThreadActivityManager, activity_tracker
+from .utils.thread_channels import ChannelDataManager, archive_deadlines
 from .utils.thread_commands import ThreadCommands
 from .utils.thread_config import AutoArchiveDuration, ThreadKeeperConfig
 from .utils.thread_management import ThreadManager
+from .utils.thread_pipeline import CreationContext, thread_creation
+from .utils.worker_pool import WorkerPool
 
 
 class ThreadKeeper(commands.Cog, name="Thread管理用cog"):
@@ -43,6 +53,37 @@ class ThreadKeeper(commands.Cog, name="Thread管理用cog"):
         self.thread_manager = ThreadManager(bot, self.logger)
         self.thread_commands = ThreadCommands(bot, self.logger)
         self.scheduled_closure_manager = ScheduledClosureManager()
+        self.thread_activity_manager = ThreadActivityManager()
+
+        # アーカイブ延長は待機時間が長いので複数スレッドを並行して処理する
+        self.extension_pool = WorkerPool(
+            "archive_extension",
+            concurrency=self.config.ARCHIVE_EXTENSION_CONCURRENCY,
+            logger=self.logger,
+        )
+
+        self._bootstrapped = False
+        self._register_creation_stages()
+
+    async def cog_unload(self):
+        thread_creation.unregister(
+            "join", "staff", "maintenance", "initial_edits", "rename", "slowmode_notice"
+        )
+        task_supervisor.unwatch(*self._supervised_loops())
+        for loop in self._supervised_loops().values():
+            loop.cancel()
+        await self.thread_activity_manager.flush()
+        await self.extension_pool.close()
+        await thread_edits.close()
+
+    def _supervised_loops(self) -> dict[str, tasks.Loop]:
+        return {
+            "watch_dog": self.watch_dog,
+            "process_scheduled_closures": self.process_scheduled_closures,
+            "flush_thread_activity": self.flush_thread_activity,
+            "dispatch_reminders": self.dispatch_reminders,
+            "retention": self.retention,
+        }
 
     def _is_valid_thread_channel(self, channel) -> bool:
         """有効なスレッドチャンネルかどうかを確認"""
@@ -56,76 +97,223 @@ class ThreadKeeper(commands.Cog, name="Thread管理用cog"):
         # self.bot.tree.copy_global_to(guild=MY_GUILD)
         pass
 
+    async def cog_load(self):
+        # リロードされた場合はon_readyが呼ばれないので、ここで起動処理を行う
+        if self.bot.is_ready():
+            await self.on_ready()
+
     @commands.Cog.listener()
     async def on_ready(self):
-        """on_ready時に発火する関数"""
-        await self.guild_setting_mng.create_table()
-        await self.channel_data_manager.create_table()
-        await self.notify_role.create_table()
-        await self.scheduled_closure_manager.create_table()
+        """on_ready時に発火する関数（再接続のたびに呼ばれる）"""
+        if not self._bootstrapped:
+            await self._bootstrap()
+            self._bootstrapped = True
+        else:
+            # 切断中に参加したサーバーのみ登録する
+            new_guilds = [g for g in self.bot.guilds if g.id not in keep_all_cache]
+            if new_guilds:
+                await self.guild_setting_mng.upsert_guilds(new_guilds)
+                await self.guild_setting_mng.load_cache()
+
+        self._resume_loops()
+
+    async def _bootstrap(self):
+        """起動後に1回だけ行う初期化"""
+        applied = await migrate()
+        if applied:
+            self.logger.info(f"database migrated: {applied}")
+
+        await self.guild_setting_mng.upsert_guilds(self.bot.guilds)
+
+        # スレッド作成時に設定をDBから読まずに済むようにキャッシュしておく
+        await self.guild_setting_mng.load_cache()
+        await self.notify_role.load_cache([guild.id for guild in self.bot.guilds])
+
+        # グローバルなコマンド同期はレート制限が厳しいので、変更があった場合のみ行う
+        if await sync_if_changed(self.bot.tree):
+            self.logger.info("application commands synced")
 
+        # アーカイブ期限と閉架予約をDBから読み込み直す
+        await self.channel_data_manager.load_archive_deadlines()
+        await self.scheduled_closure_manager.load_closure_deadlines()
+
+        # 最終発言の記録を読み込む
+        await self.thread_activity_manager.load_activity()
         for guild in self.bot.guilds:
-            await self.guild_setting_mng.upsert_guild(guild)
+            for thread in guild.threads:
+                self.thread_manager.seed_activity(thread)
+
+    def _resume_loops(self):
+        """止まっているループを起動し、task_supervisorに監視させる"""
+        for loop in self._supervised_loops().values():
+            if not loop.is_running():
+                loop.start()
+
+        # 期限駆動のループは次の期限まで周回しないので、停止のみを監視する
+        task_supervisor.watch("watch_dog", self.watch_dog)
+        task_supervisor.watch(
+            "process_scheduled_closures", self.process_scheduled_closures
+        )
+        task_supervisor.watch(
+            "flush_thread_activity",
+            self.flush_thread_activity,
+            stale_after=self.config.ACTIVITY_FLUSH_INTERVAL_SECONDS * 4,
+        )
+        task_supervisor.watch(
+            "dispatch_reminders",
+            self.dispatch_reminders,
+            stale_after=self.config.REMINDER_CHECK_INTERVAL_MINUTES * 60 * 4,
+        )
+        task_supervisor.watch(
+            "retention",
+            self.retention,
+            stale_after=self.config.RETENTION_INTERVAL_HOURS * 3600 * 2,
+        )
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild):
+        """参加したサーバーを登録する"""
+        await self.guild_setting_mng.upsert_guild(guild)
 
-        await self.bot.tree.sync()
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        """抜けたサーバーの行を全テーブルから削除する"""
+        deleted = await retention_engine.drop_guild(guild.id)
+        self.logger.info(f"guild {guild.id} removed: deleted {deleted}")
 
-        self.watch_dog.stop()
-        self.watch_dog.start()
+    @commands.Cog.listener()
+    async def on_raw_thread_delete(self, payload: discord.RawThreadDeleteEvent):
+        """削除されたスレッドの保守設定・閉架予約・除外設定をすぐに削除する
 
-        self.process_scheduled_closures.stop()
-        self.process_scheduled_closures.start()
+        キャッシュにないスレッドでも呼ばれるよう、on_thread_deleteではなくこちらを使う
+        """
+        deleted = await retention_engine.drop_thread(
+            payload.thread_id, payload.guild_id
+        )
+        if any(deleted.values()):
+            self.logger.debug(f"thread {payload.thread_id} deleted: deleted {deleted}")
 
     @commands.Cog.listener()
     async def on_thread_create(self, thread: discord.Thread):
-        """スレッド作成時のイベントハンドラー"""
-        await thread.join()
-
-        # OPとbotを呼ぶ処理
-        await self.thread_manager.add_staff_to_thread(thread)
-
-        # DBの設定を確認、管理対象としてDBに入れる
-        if await self.guild_setting_mng.is_full_maintenance(thread.guild.id):
-            archive_time = self.thread_manager.return_estimated_archive_time(thread)
-            await self.channel_data_manager.resister_channel(
-                channel_id=thread.id,
-                guild_id=thread.guild.id,
-                archive_time=archive_time,
-            )
+        """スレッド作成時のイベントハンドラー（各Cogが登録したステージを実行）"""
+        await thread_creation.run(thread)
+
+    def _register_creation_stages(self):
+        """スレッド作成パイプラインにこのCogのステージを登録する"""
+        thread_creation.register("join", self._stage_join)
+        # OPとbotを呼ぶ処理（参加後に行う）
+        thread_creation.register("staff", self._stage_staff, after=("join",))
+        thread_creation.register("maintenance", self._stage_maintenance)
+        thread_creation.register("initial_edits", self._stage_initial_edits)
+        # 以下は混雑時に後回し・省略してよい処理
+        thread_creation.register("rename", self._stage_rename, shed="defer")
+        thread_creation.register(
+            "slowmode_notice",
+            self._stage_slowmode_notice,
+            after=("initial_edits",),
+            shed="drop",
+        )
+
+    async def _stage_join(self, ctx: CreationContext):
+        async with rate_limiter.slot("thread_join", ctx.thread.guild.id):
+            await ctx.thread.join()
+
+    async def _stage_staff(self, ctx: CreationContext):
+        await self.thread_manager.add_staff_to_thread(ctx.thread)
+
+    async def _stage_maintenance(self, ctx: CreationContext):
+        """DBの設定を確認、管理対象としてDBに入れる"""
+        thread = ctx.thread
+        if not await self.guild_setting_mng.is_full_maintenance(thread.guild.id):
+            return
+
+        archive_time = self.thread_manager.return_estimated_archive_time(thread)
+        ctx.write(
+            self.channel_data_manager.build_resister_channel(
+                thread.id, thread.guild.id, archive_time
+            ),
+            after_commit=lambda: archive_deadlines.schedule(
+                (thread.id, thread.guild.id), archive_time
+            ),
+        )
+
+    async def _stage_initial_edits(self, ctx: CreationContext) -> bool:
+        """低速モード・タグの変更（renameと同じeditにまとめて送信される）
+
+        Returns:
+            bool: 低速モードを設定したか
+        """
+        thread = ctx.thread
+        slowmode = None
+        edits = []
 
         # 低速モードを引き継ぎ
-        if thread.parent is not None:
-            try:
-                if thread.parent.slowmode_delay != 0:
-                    await thread.edit(slowmode_delay=thread.parent.slowmode_delay)
-                    msg = await thread.send("低速モードを設定しました")
-                    await self.c.delete_after(msg)
-            except discord.Forbidden:
-                self.logger.error(f"Forbidden {thread} @ extend_archive_duration")
+        if thread.parent is not None and thread.parent.slowmode_delay != 0:
+            slowmode = thread_edits.edit(
+                thread, slowmode_delay=thread.parent.slowmode_delay
+            )
+            edits.append(slowmode)
 
         # フォーラムであり、タグに未解決がある場合、それをつける
         if isinstance(thread.parent, discord.ForumChannel):
             unsolved = discord.utils.get(thread.parent.available_tags, name="未解決")
 
             if unsolved is not None and unsolved not in thread.applied_tags:
-                await thread.add_tags(unsolved)
+                edits.append(thread_edits.add_tags(thread, unsolved))
 
             # 対応待ちがタグがあったらそれをつける
             waiting = discord.utils.get(thread.parent.available_tags, name="対応待ち")
             if waiting is not None and waiting not in thread.applied_tags:
-                await thread.add_tags(waiting)
-
-        # スレッド名の末尾に今日の日付（YYMMDD形式）を追加（既に付いていれば追加しない）
+                edits.append(thread_edits.add_tags(thread, waiting))
+
+        results = await asyncio.gather(*edits, return_exceptions=True)
+        error = next((r for r in results if isinstance(r, BaseException)), None)
+        if isinstance(error, discord.Forbidden):
+            self.logger.error(f"Forbidden {thread} @ on_thread_create edit")
+        elif error is not None:
+            self.logger.error(f"スレッドの初期設定に失敗: {error}")
+        return error is None and slowmode is not None
+
+    async def _stage_rename(self, ctx: CreationContext):
+        """スレッド名の末尾に今日の日付（YYMMDD形式）を追加（既に付いていれば追加しない）"""
+        thread = ctx.thread
         today_str = datetime.now().strftime("%y%m%d")
         date_pattern = r"\\d{6}$"
-        if not re.search(date_pattern, thread.name):
-            try:
-                await thread.edit(name=f"{thread.name}{today_str}")
-            except Exception as e:
-                self.logger.error(f"スレッド名の日付付与失敗: {e}")
+        if re.search(date_pattern, thread.name):
+            return
+
+        try:
+            await thread_edits.edit(thread, name=f"{thread.name}{today_str}")
+        except discord.Forbidden:
+            self.logger.error(f"Forbidden {thread} @ on_thread_create rename")
+
+    async def _stage_slowmode_notice(self, ctx: CreationContext):
+        """低速モードを設定した旨を一時的に通知する"""
+        if not ctx.results.get("initial_edits"):
+            return
+
+        thread = ctx.thread
+        try:
+            async with rate_limiter.slot("message_send", thread.guild.id):
+                msg = await thread.send("低速モードを設定しました")
+            await self.c.delete_after(msg)
+        except discord.Forbidden:
+            self.logger.error(f"Forbidden {thread} @ slowmode notice")
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
         """メッセージ送信時のイベントハンドラー"""
+        # 非アクティブ判定用に最終発言を記録（DBへはflush_thread_activityでまとめて書き込む）
+        if isinstance(message.channel, discord.Thread) and message.guild is not None:
+            activity_tracker.record(
+                thread_id=message.channel.id,
+                guild_id=message.guild.id,
+                parent_id=message.channel.parent_id,
+                message_id=message.id,
+                created_at=message.created_at,
+                is_human=not message.author.bot,
+            )
+
         # CLOSEDプレフィックスの付いたスレッドの再開処理
         if (
             isinstance(message.channel, discord.Thread)
@@ -137,16 +325,6 @@ class ThreadKeeper(commands.Cog, name="Thread管理用cog"):
                 thread_id=message.channel.id
             )
 
-        # watch_dogタスクの監視
-        if not self.watch_dog.is_running():
-            self.logger.warning("watch_dog is not running!")
-            self.watch_dog.start()
-
-        # process_scheduled_closuresタスクの監視
-        if not self.process_scheduled_closures.is_running():
-            self.logger.warning("process_scheduled_closures is not running!")
-            self.process_scheduled_closures.start()
-
     @commands.Cog.listener()
     async def on_thread_update(self, before: discord.Thread, after: discord.Thread):
         """スレッド更新時のイベントハンドラー"""
@@ -351,49 +529,92 @@ class ThreadKeeper(commands.Cog, name="Thread管理用cog"):
         try:
             cleaned_name = thread.name.replace("[CLOSED]", "")
             if cleaned_name != thread.name:
-                await thread.edit(name=cleaned_name, archived=False)
+                await thread_edits.edit(thread, name=cleaned_name, archived=False)
         except discord.Forbidden:
             self.logger.error(f"Cannot remove CLOSED prefix from thread {thread.id}")
 
-    @tasks.loop(minutes=15.0)
+    def _retry_archive_deadline(self, channel_id: int, guild_id: int, deadline):
+        """次の期限を登録する（延長が反映されていない場合は一定時間後に再試行）"""
+        retry_at = (
+            discord.utils.utcnow()
+            + archive_deadlines.lead
+            + timedelta(minutes=self.config.WATCH_DOG_INTERVAL_MINUTES)
+        )
+        archive_deadlines.schedule((channel_id, guild_id), max(deadline, retry_at))
+
+    @tasks.loop(seconds=0)
     async def watch_dog(self):
-        """定期実行タスク：アーカイブ時間延長と非アクティブリマインド"""
-        # 期限短いやつを延長する
-        about_to_expire = await self.channel_data_manager.get_about_to_expire_channel()
-        if about_to_expire is None:
-            return
+        """期限駆動タスク：アーカイブ時間延長
+
+        archive_deadlinesの次の期限まで待機し、期限を迎えたスレッドのみを処理する
+        """
+        due_channels = await archive_deadlines.wait_due()
+
+        for channel_id, guild_id in due_channels:
+            await self.extension_pool.submit(
+                self._maintain_thread, channel_id, guild_id
+            )
 
-        for channel in about_to_expire:
-            guild = self.bot.get_guild(channel.guild_id)
+        stats = self.extension_pool.stats()
+        self.logger.info(
+            f"archive extension: {len(due_channels)} queued, "
+            f"{stats.pending} pending, {stats.in_flight} in flight, "
+            f"{stats.throughput_per_minute:.1f} threads/min, "
+            f"{self.thread_manager.skipped_extensions} skipped "
+            f"({self.thread_manager.avoided_api_calls} API calls avoided)"
+        )
+
+    async def _maintain_thread(self, channel_id: int, guild_id: int):
+        """1スレッド分のアーカイブ延長（extension_poolで実行）"""
+        try:
+            await self._extend_thread(channel_id, guild_id)
+        except Exception:
+            # 取り出し済みのため、一時的なエラーでも一定時間後に再試行する
+            self._retry_archive_deadline(channel_id, guild_id, discord.utils.utcnow())
+            raise
+
+    async def _extend_thread(self, channel_id: int, guild_id: int):
+        with rate_limiter.lane(Lane.BACKGROUND):
+            guild = self.bot.get_guild(guild_id)
             if guild is None:
-                continue
-            thread = guild.get_thread(channel.channel_id)
-            if thread is None:
-                self.logger.warning(
-                    f"Thread {channel.channel_id} is not found in {guild.name}"
+                self._retry_archive_deadline(
+                    channel_id, guild_id, discord.utils.utcnow()
                 )
+                return
+            thread = guild.get_thread(channel_id)
+            if thread is None:
+                self.logger.warning(f"Thread {channel_id} is not found in {guild.name}")
                 await self.channel_data_manager.set_maintenance_channel(
-                    channel_id=channel.channel_id, guild_id=channel.guild_id, tf=False
+                    channel_id=channel_id, guild_id=guild_id, tf=False
                 )
-                continue
+                return
+
+            # 発言の記録がないスレッドもリマインドの対象にする
+            self.thread_manager.seed_activity(thread)
+
+            # 最近の発言で期限が延びていれば延長せず、実際の期限で登録し直す
+            archive_time = self.thread_manager.return_actual_archive_time(thread)
+            if archive_time - discord.utils.utcnow() > archive_deadlines.lead:
+                self.thread_manager.record_skipped_extension()
+                await self.channel_data_manager.update_archived_time(
+                    channel_id=thread.id, guild_id=guild_id, archive_time=archive_time
+                )
+                archive_deadlines.schedule((thread.id, guild_id), archive_time)
+                return
 
             # アーカイブ期限延長
             await self.thread_manager.extend_archive_duration(thread)
 
-            # 2週間リマインドチェック
-            try:
-                reminded = await self.thread_manager.check_inactivity_and_remind(thread)
-                if reminded:
-                    self.logger.info(
-                        f"Sent inactivity reminder to thread {thread.name}"
-                    )
-            except Exception as e:
-                self.logger.error(
-                    f"Error checking inactivity for thread {thread.id}: {e}"
+            # 延長後の期限を登録（on_thread_updateより先に取り出されているため）
+            if await self.channel_data_manager.is_maintenance_channel(
+                channel_id=thread.id, guild_id=guild_id
+            ):
+                self._retry_archive_deadline(
+                    thread.id,
+                    guild_id,
+                    self.thread_manager.return_estimated_archive_time(thread),
                 )
 
-            await asyncio.sleep(5)
-
     @watch_dog.before_loop
     async def before_printer(self):
         print("thread waiting...")
@@ -404,40 +625,133 @@ class ThreadKeeper(commands.Cog, name="Thread管理用cog"):
         self.logger.error(f"watch_dog error: {error}")
         return
 
-    @tasks.loop(minutes=1.0)
+    @tasks.loop(seconds=ThreadKeeperConfig.ACTIVITY_FLUSH_INTERVAL_SECONDS)
+    async def flush_thread_activity(self):
+        """on_messageで記録した最終発言をまとめてDBに書き込む"""
+        flushed = await self.thread_activity_manager.flush()
+        if flushed:
+            self.logger.debug(f"thread activity: flushed {flushed} threads")
+
+    @tasks.loop(minutes=ThreadKeeperConfig.REMINDER_CHECK_INTERVAL_MINUTES)
+    async def dispatch_reminders(self):
+        """次回リマインド時刻を過ぎたスレッドにだけリマインドを送信する"""
+        with rate_limiter.lane(Lane.BACKGROUND):
+            sent = await self.thread_manager.dispatch_due_reminders()
+        if sent:
+            self.logger.info(f"Sent inactivity reminders to {sent} threads")
+
+    @tasks.loop(hours=ThreadKeeperConfig.RETENTION_INTERVAL_HOURS)
+    async def retention(self):
+        """保持期間を過ぎた行を削除し、空いたページをDBファイルから切り詰める"""
+        report = await retention_engine.run(
+            [guild.id for guild in self.bot.guilds], self._is_thread_deleted
+        )
+        if report.total_deleted or report.pages_reclaimed:
+            self.logger.info(
+                f"retention: deleted {report.deleted}, "
+                f"purged {report.guilds_purged} guilds, "
+                f"reclaimed {report.pages_reclaimed} pages "
+                f"in {report.elapsed_seconds:.1f}s"
+            )
+
+    async def _is_thread_deleted(self, thread_id: int, guild_id: int) -> bool:
+        """スレッドが削除されたことを確認できたかどうか
+
+        キャッシュにはアーカイブされたスレッドが含まれないため、APIで確認する。
+        権限不足などで確認できない場合は削除されていないとみなす。
+        """
+        guild = self.bot.get_guild(guild_id)
+        if guild is not None and guild.get_channel_or_thread(thread_id) is not None:
+            return False
+
+        try:
+            async with rate_limiter.slot("channel_fetch", guild_id, Lane.BACKGROUND):
+                await self.bot.fetch_channel(thread_id)
+        except discord.NotFound:
+            return True
+        except discord.HTTPException:
+            return False
+        return False
+
+    @retention.error
+    async def retention_error(self, error):
+        self.logger.error(f"retention error: {error}")
+
+    @flush_thread_activity.before_loop
+    @dispatch_reminders.before_loop
+    async def before_thread_activity_loops(self):
+        # thread_activityのparent_id/next_reminder_at（マイグレーション3）が揃ってから動かす
+        await self.bot.wait_until_ready()
+        await migrate()
+
+    @dispatch_reminders.error
+    async def dispatch_reminders_error(self, error):
+        self.logger.error(f"dispatch_reminders error: {error}")
+
+    @flush_thread_activity.error
+    async def flush_thread_activity_error(self, error):
+        self.logger.error(f"flush_thread_activity error: {error}")
+
+    @tasks.loop(seconds=0)
     async def process_scheduled_closures(self):
-        """定期実行タスク：予約された閉架の実行"""
-        due_closures = await self.scheduled_closure_manager.get_due_closures()
-        if due_closures is None:
+        """期限駆動タスク：予約された閉架の実行
+
+        closure_deadlinesの次の予約時刻まで待機し、DB上の予約を確認してから閉架する
+        """
+        due_thread_ids = await closure_deadlines.wait_due()
+
+        with rate_limiter.lane(Lane.BACKGROUND):
+            for thread_id in due_thread_ids:
+                try:
+                    await self._execute_scheduled_closure(thread_id)
+                except Exception as e:
+                    # 取り出し済みでもDBには予約が残っているので、少し後にもう一度処理する
+                    self.logger.error(f"Scheduled closure for {thread_id} failed: {e}")
+                    closure_deadlines.schedule(
+                        thread_id,
+                        discord.utils.utcnow()
+                        + timedelta(
+                            minutes=self.config.SCHEDULED_CLOSURE_RETRY_MINUTES
+                        ),
+                    )
+
+    async def _execute_scheduled_closure(self, thread_id: int):
+        """1スレッド分の予約された閉架"""
+        closure = await self.scheduled_closure_manager.get_closure(thread_id)
+        if closure is None:
             return
 
-        for closure in due_closures:
-            guild = self.bot.get_guild(closure.guild_id)
-            if guild is None:
-                await self.scheduled_closure_manager.cancel_closure(closure.thread_id)
-                continue
+        # 待機中に予約が更新されていれば登録し直す
+        if closure.scheduled_close_time > datetime.now():
+            closure_deadlines.schedule(
+                thread_id, closure.scheduled_close_time.astimezone()
+            )
+            return
 
-            thread = guild.get_thread(closure.thread_id)
-            if thread is None:
-                self.logger.warning(
-                    f"Scheduled closure: Thread {closure.thread_id} not found in {guild.name}"
-                )
-                await self.scheduled_closure_manager.cancel_closure(closure.thread_id)
-                continue
+        guild = self.bot.get_guild(closure.guild_id)
+        if guild is None:
+            await self.scheduled_closure_manager.cancel_closure(closure.thread_id)
+            return
 
-            if thread.archived or self.config.CLOSED_THREAD_PREFIX in thread.name:
-                await self.scheduled_closure_manager.cancel_closure(closure.thread_id)
-                continue
+        thread = guild.get_thread(closure.thread_id)
+        if thread is None:
+            self.logger.warning(
+                f"Scheduled closure: Thread {closure.thread_id} not found in {guild.name}"
+            )
+            await self.scheduled_closure_manager.cancel_closure(closure.thread_id)
+            return
 
-            success = await self.thread_commands._execute_thread_close(thread)
+        if thread.archived or self.config.CLOSED_THREAD_PREFIX in thread.name:
             await self.scheduled_closure_manager.cancel_closure(closure.thread_id)
+            return
 
-            if success:
-                self.logger.info(
-                    f"Scheduled closure executed for thread {thread.name} in {guild.name}"
-                )
+        success = await self.thread_commands._execute_thread_close(thread)
+        await self.scheduled_closure_manager.cancel_closure(closure.thread_id)
 
-            await asyncio.sleep(self.config.THREAD_PROCESSING_SLEEP_SECONDS)
+        if success:
+            self.logger.info(
+                f"Scheduled closure executed for thread {thread.name} in {guild.name}"
+            )
 
     @process_scheduled_closures.before_loop
     async def before_process_scheduled_closures(self):
@@ -644,16 +958,16 @@ class ThreadKeeper(commands.Cog, name="Thread管理用cog"):
         await interaction.response.defer(thinking=True)
         self.logger.info("Target threads number: %d", len(interaction.guild.threads))
 
-        for thread in interaction.guild.threads:
-            try:
-                await self.thread_commands.remove_mentions_and_readd(thread)
-                # self.logger.info("Reinvited notify roles in thread %s", thread.name)
-                count += 1
-                await asyncio.sleep(2)  # レートリミット対策
-            except Exception as e:
-                self.logger.error(
-                    "スレッド%sの自動参加役職再招待失敗: %s", thread.name, e
-                )
+        with rate_limiter.lane(Lane.BACKGROUND):
+            for thread in interaction.guild.threads:
+                try:
+                    await self.thread_commands.remove_mentions_and_readd(thread)
+                    # self.logger.info("Reinvited notify roles in thread %s", thread.name)
+                    count += 1
+                except Exception as e:
+                    self.logger.error(
+                        "スレッド%sの自動参加役職再招待失敗: %s", thread.name, e
+                    )
         await interaction.followup.send(
             f"自動参加役職を{count}件のスレッドで再招待しました"
         )
@@ -0,0 +1,45 @@
+"""
+コマンドツリーが変わったときだけスラッシュコマンドを同期する
+"""
+
+import hashlib
+import json
+import pathlib
+
+from discord import app_commands
+
+try:
+    from .db import db_config
+except ImportError:
+    from db import db_config
+
+# 最後に同期したコマンドツリーのハッシュ（データベースと同じdataディレクトリに置く）
+COMMAND_TREE_HASH_PATH = db_config.db_path.parent / "command_tree.sha256"
+
+
+def command_tree_hash(tree: app_commands.CommandTree) -> str:
+    """Discordに送信する内容からコマンドツリーのハッシュを計算する"""
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands()),
+        key=lambda command: (command.get("type", 1), command["name"]),
+    )
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+async def sync_if_changed(
+    tree: app_commands.CommandTree,
+    hash_path: pathlib.Path = COMMAND_TREE_HASH_PATH,
+) -> bool:
+    """前回の同期からコマンドツリーが変わっていればtree.syncを呼ぶ
+
+    Returns:
+        bool: 同期した場合True
+    """
+    digest = command_tree_hash(tree)
+    if hash_path.exists() and hash_path.read_text().strip() == digest:
+        return False
+
+    await tree.sync()
+    hash_path.write_text(digest)
+    return True
@@ -2,20 +2,65 @@
 データベース接続設定
 """
 
+import os
 import pathlib
-from typing import Optional
+from typing import Dict, Optional, Union
 
+from sqlalchemy import Table, event, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from sqlalchemy.orm import declarative_base
+
+PragmaValue = Union[int, str]
+
+# 全テーブル共通のメタデータ（スキーマの作成・変更はmigrations.pyで行う）
+Base = declarative_base()
+
+# 接続ごとに適用するPRAGMAのプロファイル
+PRAGMA_PROFILES: Dict[str, Dict[str, PragmaValue]] = {
+    # SQLiteの既定値のまま（ロールバックジャーナル、毎コミットfsync）
+    "default": {},
+    # WALで読み書きを並行させ、fsyncはチェックポイント時のみにする
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    # balancedに加えてページキャッシュとmmapを広げる
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+        "cache_size": -65536,  # 64MiB（負の値はKiB単位）
+        "mmap_size": 268435456,  # 256MiB
+    },
+}
+DEFAULT_PRAGMA_PROFILE = "performance"
+
+# PRAGMA auto_vacuumの値（0: NONE、1: FULL、2: INCREMENTAL）
+AUTO_VACUUM_INCREMENTAL = 2
 
 
 class DatabaseConfig:
     """データベース設定を管理するクラス"""
 
-    def __init__(self, db_name: str = "data.sqlite3"):
+    def __init__(self, db_name: str = "data.sqlite3", profile: Optional[str] = None):
         self.db_name = db_name
+        self.profile = profile or os.getenv("DB_PRAGMA_PROFILE", DEFAULT_PRAGMA_PROFILE)
+        if self.profile not in PRAGMA_PROFILES:
+            raise ValueError(
+                f"Unknown pragma profile: {self.profile} "
+                f"(choose from {', '.join(PRAGMA_PROFILES)})"
+            )
         self._engine: Optional[AsyncEngine] = None
         self._db_path: Optional[pathlib.Path] = None
 
+    @property
+    def pragmas(self) -> Dict[str, PragmaValue]:
+        """接続ごとに適用するPRAGMA"""
+        return PRAGMA_PROFILES[self.profile]
+
     @property
     def db_path(self) -> pathlib.Path:
         """データベースファイルのパスを取得"""
@@ -37,9 +82,81 @@ class DatabaseConfig:
         if self._engine is None:
             db_url = f"sqlite+aiosqlite:///{self.db_path}"
             self._engine = create_async_engine(db_url, echo=False)
+            event.listen(self._engine.sync_engine, "connect", self._apply_pragmas)
+            event.listen(self._engine.sync_engine, "begin", self._begin)
 
         return self._engine
 
+    def _apply_pragmas(self, dbapi_connection, connection_record) -> None:
+        """新しい接続にプロファイルのPRAGMAを適用する"""
+        # ドライバによる暗黙のBEGINを止め、_beginでSQLAlchemyから明示的に発行する
+        # （SAVEPOINTとトランザクション内のDDLを正しく扱うため）
+        dbapi_connection.isolation_level = None
+
+        cursor = dbapi_connection.cursor()
+        try:
+            # まだ何も書き込まれていない新しいDBだけに効くため、journal_modeより先に設定する
+            # （既存のDBは変わらない。切り替えはenable_incremental_vacuumで行う）
+            cursor.execute(f"PRAGMA auto_vacuum={AUTO_VACUUM_INCREMENTAL}")
+            for name, value in self.pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _begin(conn) -> None:
+        # AUTOCOMMITの接続（VACUUMなどトランザクション外で実行する文用）ではBEGINしない
+        if conn.get_execution_options().get("isolation_level") == "AUTOCOMMIT":
+            return
+        conn.exec_driver_sql("BEGIN")
+
+    async def checkpoint(self) -> None:
+        """WALの内容をデータベースファイルに書き戻す（ファイルを直接コピーする前に呼ぶ）"""
+        if str(self.pragmas.get("journal_mode", "")).upper() != "WAL":
+            return
+        async with self.engine.connect() as conn:
+            await conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+
+    async def enable_incremental_vacuum(self) -> bool:
+        """既存のDBのauto_vacuumをINCREMENTALにする
+
+        DB全体をVACUUMで作り直すため、DBが大きいと時間がかかり、その間は書き込めない。
+        新しいDBは接続時のPRAGMAで最初からINCREMENTALになる。
+
+        Returns:
+            bool: 切り替えた場合True
+        """
+        async with self.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            if await conn.scalar(text("PRAGMA auto_vacuum")) == AUTO_VACUUM_INCREMENTAL:
+                return False
+            await conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            await conn.exec_driver_sql("VACUUM")
+        return True
+
+    async def incremental_vacuum(self, max_pages: int = 0) -> int:
+        """空きページをファイルから切り詰める
+
+        Args:
+            max_pages (int): 1回に解放するページ数の上限（0はすべて）
+
+        Returns:
+            int: 解放したページ数
+        """
+        async with self.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            if await conn.scalar(text("PRAGMA auto_vacuum")) != AUTO_VACUUM_INCREMENTAL:
+                return 0
+            before = await conn.scalar(text("PRAGMA freelist_count"))
+            # incremental_vacuumは1ステップごとに1ページ解放するため、
+            # 最後までステップを進めるexecutescriptで実行する
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.executescript(
+                f"PRAGMA incremental_vacuum({int(max_pages)});"
+            )
+            after = await conn.scalar(text("PRAGMA freelist_count"))
+        return before - after
+
     def get_connection_info(self) -> dict:
         """接続情報を取得（デバッグ用）"""
         return {
@@ -47,9 +164,21 @@ class DatabaseConfig:
             "db_exists": self.db_path.exists(),
             "db_name": self.db_name,
             "connection_url": f"sqlite+aiosqlite:///{self.db_path}",
+            "pragma_profile": self.profile,
+            "pragmas": dict(self.pragmas),
         }
 
 
+def create_indexes(sync_conn, table: Table) -> None:
+    """テーブルに定義されたインデックスのうち、未作成のものを作成する
+
+    metadata.create_allは既存テーブルにインデックスを追加しないため、
+    create_allの後にrun_syncで呼ぶ。
+    """
+    for index in table.indexes:
+        index.create(sync_conn, checkfirst=True)
+
+
 # デフォルトのデータベース設定インスタンス
 db_config = DatabaseConfig()
 
@@ -0,0 +1,139 @@
+"""
+書き込み専用タスクによるグループコミット
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.sql import Executable
+
+try:
+    from .db import engine
+except ImportError:
+    from db import engine
+
+
+@dataclass
+class _WriteOp:
+    statements: tuple[Executable, ...]
+    future: asyncio.Future
+    rowcounts: List[int] = field(default_factory=list)
+    error: Optional[BaseException] = None
+
+
+class DatabaseWriter:
+    """すべての書き込みを1つのタスクで受け付け、まとめてコミットするクラス
+
+    書き込みは `max_batch` 件たまるか、最初の書き込みから `max_delay_ms`
+    経過した時点で1つのトランザクションとしてコミットする。
+    呼び出し元はコミット完了（永続化）まで待機する。
+    1回のexecuteに渡した文は同じSAVEPOINT内で実行され、
+    失敗した場合はその呼び出しだけがロールバックされる。
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        max_batch: int = 64,
+        max_delay_ms: float = 10.0,
+    ) -> None:
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.logger = logging.getLogger("discord")
+
+        self._queue: Optional[asyncio.Queue[_WriteOp]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.commits = 0  # コミット回数
+        self.operations = 0  # 処理した書き込み数
+
+    def _ensure_started(self) -> asyncio.Queue[_WriteOp]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            # 別のイベントループ（asyncio.runのスクリプト実行など）では作り直す
+            if self._loop is not loop or self._queue is None:
+                self._queue = asyncio.Queue()
+            self._loop = loop
+            self._task = loop.create_task(self._run(), name="db_writer")
+        assert self._queue is not None
+        return self._queue
+
+    async def execute(self, *statements: Executable) -> List[int]:
+        """文を書き込みキューに入れ、コミットされるまで待機する
+
+        Returns:
+            List[int]: 各文のrowcount
+        """
+        queue = self._ensure_started()
+        op = _WriteOp(
+            statements=statements, future=asyncio.get_running_loop().create_future()
+        )
+        await queue.put(op)
+        return await op.future
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._commit(batch)
+            except Exception as e:
+                self.logger.error(f"db_writer: commit failed: {e}")
+                for op in batch:
+                    if not op.future.done():
+                        op.future.set_exception(e)
+            else:
+                for op in batch:
+                    if op.future.done():
+                        continue
+                    if op.error is not None:
+                        op.future.set_exception(op.error)
+                    else:
+                        op.future.set_result(op.rowcounts)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _commit(self, batch: List[_WriteOp]) -> None:
+        async with AsyncSession(self.engine) as session:
+            async with session.begin():
+                for op in batch:
+                    if op.future.cancelled():
+                        continue
+                    try:
+                        async with session.begin_nested():
+                            for stmt in op.statements:
+                                result = await session.execute(stmt)
+                                op.rowcounts.append(result.rowcount)
+                    except Exception as e:
+                        op.error = e
+                        op.rowcounts.clear()
+
+        self.commits += 1
+        self.operations += len(batch)
+
+    async def flush(self) -> None:
+        """キューに入っている書き込みがすべてコミットされるまで待機する"""
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+
+# 全マネージャー共通の書き込みタスク
+db_writer = DatabaseWriter(engine)
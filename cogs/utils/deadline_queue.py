@@ -0,0 +1,123 @@
+"""
+期限付きジョブの待ち行列（min-heap）
+"""
+
+import asyncio
+import heapq
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Generic, Hashable, Iterable, List, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+
+def _as_utc(dt: datetime) -> datetime:
+    """naiveなdatetimeはUTCとみなしてaware化する"""
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+class DeadlineQueue(Generic[K]):
+    """キーごとの期限をmin-heapで保持し、次の期限ちょうどに起床するキュー
+
+    同じキーを再登録した場合は古いエントリを遅延削除する。
+    `lead` を指定すると、期限よりその分だけ早く取り出される。
+    """
+
+    def __init__(self, lead: timedelta = timedelta(0)) -> None:
+        self.lead = lead
+        self._heap: List[Tuple[datetime, int, K]] = []
+        self._due_at: Dict[K, datetime] = {}
+        self._counter = 0  # 同時刻エントリの比較用
+        self._changed = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._due_at)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._due_at
+
+    def schedule(self, key: K, deadline: datetime) -> None:
+        """キーの期限を登録・更新する
+
+        Args:
+            key (K): ジョブのキー
+            deadline (datetime): 期限（naiveの場合はUTCとみなす）
+        """
+        due_at = _as_utc(deadline) - self.lead
+        if self._due_at.get(key) == due_at:
+            return
+
+        self._due_at[key] = due_at
+        self._counter += 1
+        heapq.heappush(self._heap, (due_at, self._counter, key))
+
+        # 先頭が変わった場合のみ待機中のタスクを起こす
+        if self._heap[0][2] == key:
+            self._changed.set()
+
+    def unschedule(self, key: K) -> None:
+        """キーを取り除く（heap上のエントリは遅延削除）"""
+        if self._due_at.pop(key, None) is not None:
+            self._changed.set()
+
+    def clear(self) -> None:
+        """すべてのキーを取り除く（少しずつscheduleし直す前に使う）"""
+        self._heap.clear()
+        self._due_at.clear()
+        self._changed.set()
+
+    def load(self, entries: Iterable[Tuple[K, datetime]]) -> None:
+        """既存の内容を破棄して一括登録する"""
+        self._heap.clear()
+        self._due_at.clear()
+        for key, deadline in entries:
+            due_at = _as_utc(deadline) - self.lead
+            self._due_at[key] = due_at
+            self._counter += 1
+            self._heap.append((due_at, self._counter, key))
+        heapq.heapify(self._heap)
+        self._changed.set()
+
+    def next_due(self) -> Optional[datetime]:
+        """次に取り出される時刻を取得する"""
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def _discard_stale(self) -> None:
+        while self._heap:
+            due_at, _, key = self._heap[0]
+            if self._due_at.get(key) == due_at:
+                return
+            heapq.heappop(self._heap)
+
+    def pop_due(self, now: Optional[datetime] = None) -> List[K]:
+        """期限を迎えたキーをすべて取り出す"""
+        now = _as_utc(now) if now is not None else datetime.now(timezone.utc)
+        due: List[K] = []
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now:
+                return due
+            _, _, key = heapq.heappop(self._heap)
+            del self._due_at[key]
+            due.append(key)
+
+    async def wait_due(self) -> List[K]:
+        """次の期限まで待機し、期限を迎えたキーを返す"""
+        while True:
+            self._changed.clear()
+            due = self.pop_due()
+            if due:
+                return due
+
+            next_due = self.next_due()
+            if next_due is None:
+                await self._changed.wait()
+                continue
+
+            delay = (next_due - datetime.now(timezone.utc)).total_seconds()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=max(delay, 0))
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,132 @@
+"""
+同じスレッドへの連続したeditを1回のリクエストにまとめる
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import discord
+
+try:
+    from .rate_limiter import rate_limiter
+except ImportError:
+    from rate_limiter import rate_limiter
+
+# フォーラム投稿に付けられるタグの上限
+MAX_APPLIED_TAGS = 5
+
+
+@dataclass
+class _PendingEdit:
+    thread: discord.Thread
+    fields: Dict[str, Any] = field(default_factory=dict)
+    tags: List[discord.ForumTag] = field(default_factory=list)
+    futures: List[asyncio.Future] = field(default_factory=list)
+
+
+class ThreadEditCoalescer:
+    """スレッドごとの変更を短い時間まとめてから1回のeditで送信するクラス
+
+    使い方:
+        results = await asyncio.gather(
+            thread_edits.edit(thread, slowmode_delay=10),
+            thread_edits.add_tags(thread, tag),
+            return_exceptions=True,
+        )
+
+    editとadd_tagsは呼び出した時点で変更を登録し、送信完了まで待つFutureを返す。
+    同じ項目は後から登録した値で上書きする。
+    Cogのアンロード時はcloseで待機中の変更を送信し終えてから終了すること。
+    """
+
+    def __init__(self, window_seconds: float = 0.2) -> None:
+        self.window_seconds = window_seconds
+        self._pending: Dict[int, _PendingEdit] = {}
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._flush_tasks: set[asyncio.Task] = set()
+        self.requested = 0  # 登録された変更の数
+        self.sent = 0  # 実際に送信したeditの数
+
+    def _register(self, thread: discord.Thread) -> Tuple[_PendingEdit, asyncio.Future]:
+        loop = asyncio.get_running_loop()
+        pending = self._pending.get(thread.id)
+        if pending is None:
+            pending = _PendingEdit(thread=thread)
+            self._pending[thread.id] = pending
+            self._timers[thread.id] = loop.call_later(
+                self.window_seconds, self._start_flush, thread.id
+            )
+        else:
+            pending.thread = thread
+
+        future = loop.create_future()
+        pending.futures.append(future)
+        self.requested += 1
+        return pending, future
+
+    def edit(self, thread: discord.Thread, **fields: Any) -> asyncio.Future:
+        """thread.editの引数を登録する"""
+        pending, future = self._register(thread)
+        pending.fields.update(fields)
+        return future
+
+    def add_tags(
+        self, thread: discord.Thread, *tags: discord.ForumTag
+    ) -> asyncio.Future:
+        """付与するタグを登録する（thread.add_tags相当）"""
+        pending, future = self._register(thread)
+        pending.tags.extend(tags)
+        return future
+
+    def _start_flush(self, thread_id: int) -> None:
+        self._timers.pop(thread_id, None)
+        task = asyncio.create_task(
+            self._flush(thread_id), name=f"thread_edit:{thread_id}"
+        )
+        # イベントループは弱参照しか持たないので、完了まで参照を保持する
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def close(self) -> None:
+        """まとめ待ちの変更をすぐに送信し、送信中のものも含めて完了を待つ"""
+        for thread_id, timer in list(self._timers.items()):
+            timer.cancel()
+            self._start_flush(thread_id)
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+
+    async def _flush(self, thread_id: int) -> None:
+        pending = self._pending.pop(thread_id, None)
+        if pending is None:
+            return
+
+        thread = pending.thread
+        fields = dict(pending.fields)
+        if pending.tags:
+            applied = list(fields.get("applied_tags", thread.applied_tags))
+            for tag in pending.tags:
+                if tag not in applied and len(applied) < MAX_APPLIED_TAGS:
+                    applied.append(tag)
+            fields["applied_tags"] = applied
+
+        result: Optional[BaseException] = None
+        edited: Optional[discord.Thread] = None
+        try:
+            async with rate_limiter.slot("thread_edit", thread.guild.id):
+                edited = await thread.edit(**fields)
+            self.sent += 1
+        except Exception as e:
+            result = e
+
+        for future in pending.futures:
+            if future.done():
+                continue
+            if result is not None:
+                future.set_exception(result)
+            else:
+                future.set_result(edited)
+
+
+# 全Cog共通のeditまとめ役
+thread_edits = ThreadEditCoalescer()
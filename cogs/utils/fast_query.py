@@ -0,0 +1,207 @@
+"""
+ORMを通さずにSQLAlchemy Coreで読み取りを行うヘルパー
+
+よく呼ばれる読み取りは、各マネージャーのモジュールでbindparamを使った文を
+モジュール読み込み時に1回だけ組み立てておき、ここにあるヘルパーで実行する。
+同じ文オブジェクトを使い回すため、SQLAlchemyのコンパイル済みキャッシュに毎回ヒットし、
+AsyncSessionやidentity mapも作らない。
+
+件数の多い読み取りはiter_keysetでページごとに読み、全件をリストにせずに処理する。
+
+    python -m cogs.utils.fast_query で従来のORM経由の読み取りとの比較ができる。
+"""
+
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    TypeVar,
+)
+
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.sql import ColumnElement, Select
+
+try:
+    from .db import engine
+except ImportError:
+    from db import engine
+
+T = TypeVar("T")
+
+# iter_keysetで1回に読む行数
+DEFAULT_PAGE_SIZE = 500
+
+
+async def fetch_scalar(
+    stmt: Select, params: Mapping[str, Any], target: AsyncEngine = engine
+) -> Any:
+    """先頭行の先頭列を取得する（EXISTSや単一列の取得に使う）"""
+    async with target.connect() as conn:
+        return await conn.scalar(stmt, params)
+
+
+async def fetch_scalars(
+    stmt: Select, params: Mapping[str, Any], target: AsyncEngine = engine
+) -> List[Any]:
+    """全行の先頭列を取得する"""
+    async with target.connect() as conn:
+        result = await conn.scalars(stmt, params)
+        return list(result)
+
+
+async def fetch_one(
+    stmt: Select,
+    params: Mapping[str, Any],
+    row_type: Callable[..., T],
+    target: AsyncEngine = engine,
+) -> Optional[T]:
+    """先頭行をrow_typeに変換して取得する（列の順番はrow_typeの引数の順に合わせる）"""
+    async with target.connect() as conn:
+        result = await conn.execute(stmt, params)
+        row = result.first()
+    return row_type(*row) if row is not None else None
+
+
+async def iter_keyset(
+    stmt: Select,
+    keys: Sequence[ColumnElement],
+    row_type: Callable[..., T],
+    page_size: int = DEFAULT_PAGE_SIZE,
+    target: AsyncEngine = engine,
+) -> AsyncIterator[T]:
+    """stmtの結果をkeysの順にpage_size件ずつ読み、1行ずつrow_typeに変換して返す
+
+    前のページの最後のキーより後ろを読むキーセット方式のため、OFFSETと違い
+    後ろのページでも読み飛ばしが発生しない。ページごとに接続を返すので、
+    呼び出し側の処理中に読み取りトランザクションを開いたままにしない。
+
+    Args:
+        stmt (Select): ORDER BYとLIMITを付けていない文
+        keys (Sequence[ColumnElement]): 結果を一意に並べる列（stmtの列に含めること）
+    """
+    if page_size < 1:
+        raise ValueError("page_size must be at least 1")
+
+    last: Optional[tuple] = None
+    while True:
+        page = stmt.order_by(*keys).limit(page_size)
+        if last is not None:
+            page = page.where(tuple_(*keys) > tuple_(*last))
+
+        async with target.connect() as conn:
+            result = await conn.execute(page)
+            rows = result.all()
+
+        for row in rows:
+            yield row_type(*row)
+        if len(rows) < page_size:
+            return
+        last = tuple(getattr(rows[-1], key.key) for key in keys)
+
+
+if __name__ == "__main__":
+    # 従来のORM経由の読み取りとの比較
+    import asyncio
+    import pathlib
+    import tempfile
+    import time
+    from datetime import datetime
+
+    from sqlalchemy import insert, select
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    from cogs.utils.migrations import migrate
+    from cogs.utils.thread_channels import (
+        CHANNEL_DATA,
+        MAINTENANCE_CHANNEL_EXISTS,
+        ChannelData,
+        ChannelDataDB,
+    )
+
+    ROWS = 5000
+    LOOKUPS = 2000
+
+    async def orm_is_maintenance(bench: AsyncEngine, channel_id: int) -> bool:
+        async with AsyncSession(bench) as session:
+            async with session.begin():
+                stmt = (
+                    select(ChannelDataDB)
+                    .where(ChannelDataDB.channel_id == channel_id)
+                    .where(ChannelDataDB.guild_id == 1)
+                    .where(ChannelDataDB.keep)
+                )
+                result = await session.execute(stmt)
+                return result.fetchone() is not None
+
+    async def orm_get_channel(
+        bench: AsyncEngine, channel_id: int
+    ) -> Optional[ChannelData]:
+        async with AsyncSession(bench) as session:
+            async with session.begin():
+                stmt = (
+                    select(ChannelDataDB)
+                    .where(ChannelDataDB.channel_id == channel_id)
+                    .where(ChannelDataDB.guild_id == 1)
+                )
+                result = await session.execute(stmt)
+                row = result.fetchone()
+                if row is None:
+                    return None
+                return ChannelData(
+                    channel_id=row[0].channel_id,
+                    guild_id=row[0].guild_id,
+                    keep=row[0].keep,
+                    archive_time=row[0].archive_time,
+                )
+
+    async def core_is_maintenance(bench: AsyncEngine, channel_id: int) -> bool:
+        params = {"channel_id": channel_id, "guild_id": 1}
+        return bool(await fetch_scalar(MAINTENANCE_CHANNEL_EXISTS, params, bench))
+
+    async def core_get_channel(
+        bench: AsyncEngine, channel_id: int
+    ) -> Optional[ChannelData]:
+        params = {"channel_id": channel_id, "guild_id": 1}
+        return await fetch_one(CHANNEL_DATA, params, ChannelData, bench)
+
+    async def measure(name: str, func, bench: AsyncEngine) -> None:
+        started = time.perf_counter()
+        for i in range(LOOKUPS):
+            await func(bench, i * 7 % (ROWS * 2))
+        elapsed = time.perf_counter() - started
+        print(f"{name:<22} {LOOKUPS / elapsed:8.0f} lookups/s")
+
+    async def main() -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = pathlib.Path(tmp) / "benchmark.sqlite3"
+            bench = create_async_engine(f"sqlite+aiosqlite:///{path}")
+            await migrate(bench)
+            async with bench.begin() as conn:
+                await conn.execute(
+                    insert(ChannelDataDB),
+                    [
+                        dict(
+                            channel_id=i,
+                            guild_id=1,
+                            keep=i % 2 == 0,
+                            archive_time=datetime.now(),
+                        )
+                        for i in range(ROWS)
+                    ],
+                )
+
+            for name, func in (
+                ("orm is_maintenance", orm_is_maintenance),
+                ("core is_maintenance", core_is_maintenance),
+                ("orm get_channel_data", orm_get_channel),
+                ("core get_channel_data", core_get_channel),
+            ):
+                await measure(name, func, bench)
+            await bench.dispose()
+
+    asyncio.run(main())
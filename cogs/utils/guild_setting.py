@@ -3,23 +3,29 @@ import pathlib
 from dataclasses import dataclass
 from datetime import datetime
 import re
-from typing import List, Optional
+from typing import Iterable, List, Optional
 
 import discord
-from sqlalchemy import delete, exc, insert, select, update
+from sqlalchemy import bindparam, delete, exc, insert, select, update
 from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.schema import Column
 from sqlalchemy.types import VARCHAR, BigInteger, Boolean, DateTime, Integer, String
 
 try:
-    from .db import engine
+    from .db import Base, engine
+    from .db_writer import db_writer
+    from .fast_query import fetch_scalar
+    from .setting_cache import MISSING, keep_all_cache
 except ImportError:
-    from db import engine
+    from db import Base, engine
+    from db_writer import db_writer
+    from fast_query import fetch_scalar
+    from setting_cache import MISSING, keep_all_cache
 
-Base = declarative_base()
+# 1文あたりのupsert件数（SQLiteのバインド変数の上限対策）
+UPSERT_CHUNK_SIZE = 500
 
 
 @dataclass
@@ -38,15 +44,16 @@ class GuildSettingDB(Base):
     default_archive_duration = Column(Integer, default=1440)  # 保持時間：24時間
 
 
+# is_full_maintenance用の文
+KEEP_ALL = select(GuildSettingDB.keep_all).where(
+    GuildSettingDB.guild_id == bindparam("guild_id")
+)
+
+
 class GuildSettingManager:
     def __init__(self) -> None:
         pass
 
-    async def create_table(self) -> None:
-        """テーブルを作成する関数"""
-        async with engine.begin() as conn:
-            await conn.run_sync(GuildSettingDB.metadata.create_all)
-
     @staticmethod
     def return_dataclass(data: List[GuildSettingDB]) -> SettingData:
         db_data = data[0]
@@ -77,15 +84,35 @@ class GuildSettingManager:
         Args:
             guild_id (int): guildのid
         """
-        async with AsyncSession(engine) as session:
-            async with session.begin():
-                stmt = insert(GuildSettingDB).values(
-                    guild_id=guild.id, guild_name=guild.name
-                )
-                do_nothing_stmt = stmt.on_conflict_do_nothing(
-                    index_elements=["guild_id"]
-                )
-                await session.execute(do_nothing_stmt)
+        stmt = insert(GuildSettingDB).values(guild_id=guild.id, guild_name=guild.name)
+        do_nothing_stmt = stmt.on_conflict_do_nothing(index_elements=["guild_id"])
+        await db_writer.execute(do_nothing_stmt)
+        keep_all_cache.invalidate(guild.id)
+
+    async def upsert_guilds(self, guilds: Iterable[discord.Guild]) -> int:
+        """複数のギルドをまとめてupsertする関数（1トランザクションで書き込む）
+
+        Args:
+            guilds (Iterable[discord.Guild]): 登録するギルド
+
+        Returns:
+            int: 新しく登録したギルド数
+        """
+        values = [dict(guild_id=g.id, guild_name=g.name) for g in guilds]
+        if not values:
+            return 0
+
+        statements = []
+        for start in range(0, len(values), UPSERT_CHUNK_SIZE):
+            stmt = insert(GuildSettingDB).values(
+                values[start : start + UPSERT_CHUNK_SIZE]
+            )
+            statements.append(stmt.on_conflict_do_nothing(index_elements=["guild_id"]))
+        rowcounts = await db_writer.execute(*statements)
+
+        for value in values:
+            keep_all_cache.invalidate(value["guild_id"])
+        return sum(rowcounts)
 
     async def set_full_maintenance(self, guild_id: int, tf: bool) -> None:
         """サーバーのスレッドをすべて延命するか切り替える関数
@@ -94,14 +121,28 @@ class GuildSettingManager:
             guild_id (int): サーバーID
             tf (bool): スレッドを延命するかどうか
         """
+        stmt = (
+            update(GuildSettingDB)
+            .where(GuildSettingDB.guild_id == guild_id)
+            .values(keep_all=tf)
+        )
+        await db_writer.execute(stmt)
+        keep_all_cache.invalidate(guild_id)
+
+    async def load_cache(self) -> int:
+        """全サーバーの設定をキャッシュに読み込む関数
+
+        Returns:
+            int: 読み込んだサーバー数
+        """
         async with AsyncSession(engine) as session:
             async with session.begin():
-                stmt = (
-                    update(GuildSettingDB)
-                    .where(GuildSettingDB.guild_id == guild_id)
-                    .values(keep_all=tf)
-                )
-                await session.execute(stmt)
+                stmt = select(GuildSettingDB.guild_id, GuildSettingDB.keep_all)
+                result = await session.execute(stmt)
+                rows = result.fetchall()
+
+        keep_all_cache.load((guild_id, keep_all) for guild_id, keep_all in rows)
+        return len(rows)
 
     async def is_full_maintenance(self, guild_id: int) -> bool:
         """サーバーのスレッドをすべて延命するかどうかを確認する関数
@@ -112,15 +153,13 @@ class GuildSettingManager:
         Returns:
             bool: するならTrue、しないならFalse
         """
-        async with AsyncSession(engine) as session:
-            async with session.begin():
-                stmt = select(GuildSettingDB.keep_all).where(
-                    GuildSettingDB.guild_id == guild_id
-                )
-                result = await session.execute(stmt)
-                result = result.fetchone()
-                result = result[0]
-                return result
+        cached = keep_all_cache.get(guild_id)
+        if cached is not MISSING:
+            return cached
+
+        result = await fetch_scalar(KEEP_ALL, {"guild_id": guild_id})
+        keep_all_cache.set(guild_id, result)
+        return result
 
     async def get_guild_setting(self, guild_id: int) -> Optional[SettingData]:
         """guild_idに対応するguild_settingを取得する関数
@@ -0,0 +1,128 @@
+"""
+スキーマのバージョン管理
+
+適用済みのバージョンはPRAGMA user_versionに記録する。
+新しいDBでは1番目のマイグレーションが最新のモデル定義でテーブルを作るため、
+列の追加などの後続のマイグレーションは既に適用済みでも失敗しないように書くこと。
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Callable, List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+try:
+    from .db import Base, create_indexes, engine
+
+    # Base.metadataに全テーブルを登録するためにモデルを読み込む
+    from .guild_setting import GuildSettingDB  # noqa: F401
+    from .notify_role import NotifyRoleDB  # noqa: F401
+    from .reminder_exclusions import ReminderExclusionDB  # noqa: F401
+    from .scheduled_closures import ScheduledClosureDB  # noqa: F401
+    from .thread_activity import ThreadActivityDB  # noqa: F401
+    from .thread_channels import ChannelDataDB  # noqa: F401
+except ImportError:
+    from db import Base, create_indexes, engine
+    from guild_setting import GuildSettingDB  # noqa: F401
+    from notify_role import NotifyRoleDB  # noqa: F401
+    from reminder_exclusions import ReminderExclusionDB  # noqa: F401
+    from scheduled_closures import ScheduledClosureDB  # noqa: F401
+    from thread_activity import ThreadActivityDB  # noqa: F401
+    from thread_channels import ChannelDataDB  # noqa: F401
+
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+def _add_column_if_missing(
+    conn: Connection, table: str, column: str, definition: str
+) -> None:
+    columns = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in columns:
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _create_tables(conn: Connection) -> None:
+    Base.metadata.create_all(conn)
+
+
+def _add_reminder_roles(conn: Connection) -> None:
+    _add_column_if_missing(conn, "reminder_exclusions", "roles", "TEXT DEFAULT '[]'")
+
+
+def _add_thread_activity_reminder_columns(conn: Connection) -> None:
+    _add_column_if_missing(conn, "thread_activity", "parent_id", "BIGINT")
+    _add_column_if_missing(conn, "thread_activity", "next_reminder_at", "DATETIME")
+
+
+def _add_channel_unkept_at(conn: Connection) -> None:
+    _add_column_if_missing(conn, "channel_setting", "unkept_at", "DATETIME")
+    # 既に保守を外している行は、この時点から保持期間を数える
+    conn.exec_driver_sql(
+        "UPDATE channel_setting SET unkept_at = CURRENT_TIMESTAMP "
+        "WHERE keep = 0 AND unkept_at IS NULL"
+    )
+
+
+def _create_indexes(conn: Connection) -> None:
+    # create_allは既存テーブルにインデックスを追加しないため
+    for table in Base.metadata.sorted_tables:
+        create_indexes(conn, table)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "テーブルを作成", _create_tables),
+    Migration(2, "reminder_exclusionsにrolesを追加", _add_reminder_roles),
+    Migration(
+        3,
+        "thread_activityにparent_idとnext_reminder_atを追加",
+        _add_thread_activity_reminder_columns,
+    ),
+    Migration(4, "検索用のインデックスを作成", _create_indexes),
+    Migration(5, "channel_settingにunkept_atを追加", _add_channel_unkept_at),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+
+# 複数のCogのon_readyから同時に呼ばれても1回だけ適用する
+_migrate_lock = asyncio.Lock()
+
+
+def _apply_pending(conn: Connection) -> List[int]:
+    current = conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version <= current:
+            continue
+        migration.apply(conn)
+        applied.append(migration.version)
+    conn.exec_driver_sql(f"PRAGMA user_version = {LATEST_VERSION}")
+    return applied
+
+
+async def migrate(target: AsyncEngine = engine) -> List[int]:
+    """未適用のマイグレーションを1トランザクションで適用する関数
+
+    DBが最新の場合はuser_versionを1回読むだけで終わる。
+
+    Returns:
+        List[int]: 適用したバージョン
+    """
+    async with _migrate_lock:
+        async with target.connect() as conn:
+            current = await conn.scalar(text("PRAGMA user_version")) or 0
+        if current >= LATEST_VERSION:
+            return []
+
+        async with target.begin() as conn:
+            return await conn.run_sync(_apply_pending)
+
+
+if __name__ == "__main__":
+    print(f"applied: {asyncio.run(migrate())}")
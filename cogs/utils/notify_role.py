@@ -5,20 +5,23 @@ from datetime import datetime
 from typing import List, Optional, Tuple
 
 import discord
-from sqlalchemy import delete, exc, insert, select, update
+from sqlalchemy import bindparam, delete, exc, insert, select, update
 from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.schema import Column
 from sqlalchemy.types import VARCHAR, BigInteger, Boolean, DateTime, Integer, String
 
 try:
-    from .db import engine
+    from .db import Base, engine
+    from .db_writer import db_writer
+    from .fast_query import fetch_scalars
+    from .setting_cache import MISSING, notify_role_cache
 except ImportError:
-    from db import engine
-
-Base = declarative_base()
+    from db import Base, engine
+    from db_writer import db_writer
+    from fast_query import fetch_scalars
+    from setting_cache import MISSING, notify_role_cache
 
 
 @dataclass
@@ -33,15 +36,16 @@ class NotifyRoleDB(Base):
     id = Column(BigInteger, primary_key=True, nullable=False)
 
 
+# return_notified用の文
+NOTIFY_ROLE_IDS = select(NotifyRoleDB.id).where(
+    NotifyRoleDB.guild_id == bindparam("guild_id")
+)
+
+
 class NotifySettingManager:
     def __init__(self) -> None:
         pass
 
-    async def create_table(self) -> None:
-        """テーブルを作成する関数"""
-        async with engine.begin() as conn:
-            await conn.run_sync(NotifyRoleDB.metadata.create_all)
-
     @staticmethod
     def return_dataclass(data: List[NotifyRoleDB]) -> NotifyRole:
         db_data = data[0]
@@ -63,18 +67,17 @@ class NotifySettingManager:
             guild_id (int): サーバーのID
             role_ids (List[int]): 役職IDリスト
         """
-        async with AsyncSession(engine) as session:
-            async with session.begin():
-                # 既存の通知対象を全削除
-                await session.execute(
-                    delete(NotifyRoleDB).where(NotifyRoleDB.guild_id == guild_id)
+        # 既存の通知対象を全削除
+        statements = [delete(NotifyRoleDB).where(NotifyRoleDB.guild_id == guild_id)]
+        # 新しい通知対象を一括追加
+        if role_ids:
+            statements.append(
+                insert(NotifyRoleDB).values(
+                    [{"guild_id": guild_id, "id": rid} for rid in role_ids]
                 )
-                # 新しい通知対象を一括追加
-                if role_ids:
-                    await session.execute(
-                        insert(NotifyRoleDB),
-                        [{"guild_id": guild_id, "id": rid} for rid in role_ids],
-                    )
+            )
+        await db_writer.execute(*statements)
+        notify_role_cache.invalidate(guild_id)
 
     async def delete_notify(self, guild_id: int) -> None:
         """通知対象を削除する関数
@@ -82,10 +85,33 @@ class NotifySettingManager:
         Args:
             guild_id (int): サーバーのID
         """
+        stmt = delete(NotifyRoleDB).where(NotifyRoleDB.guild_id == guild_id)
+        await db_writer.execute(stmt)
+        notify_role_cache.invalidate(guild_id)
+
+    async def load_cache(self, guild_ids: List[int]) -> int:
+        """指定したサーバーの通知対象をキャッシュに読み込む関数
+
+        Args:
+            guild_ids (List[int]): サーバーIDのリスト（通知対象がなければNoneとして保持）
+
+        Returns:
+            int: 通知対象が設定されているサーバー数
+        """
         async with AsyncSession(engine) as session:
             async with session.begin():
-                stmt = delete(NotifyRoleDB).where(NotifyRoleDB.guild_id == guild_id)
-                await session.execute(stmt)
+                stmt = select(NotifyRoleDB.guild_id, NotifyRoleDB.id)
+                result = await session.execute(stmt)
+                rows = result.fetchall()
+
+        roles: dict[int, Optional[List[int]]] = dict.fromkeys(guild_ids)
+        for guild_id, role_id in rows:
+            role_ids = roles.get(guild_id)
+            if role_ids is None:
+                roles[guild_id] = role_ids = []
+            role_ids.append(role_id)
+        notify_role_cache.load(roles.items())
+        return sum(1 for role_ids in roles.values() if role_ids)
 
     async def return_notified(self, guild_id: int) -> Optional[List[int]]:
         """通知対象を取得する関数
@@ -96,17 +122,14 @@ class NotifySettingManager:
         Returns:
             Optional[List[int]]: リスト
         """
-        async with AsyncSession(engine) as session:
-            async with session.begin():
-                stmt = select(NotifyRoleDB).where(NotifyRoleDB.guild_id == guild_id)
-                result = await session.execute(stmt)
-                result = result.fetchall()
-                result = [self.return_dataclass(result).id for result in result]
-
-                if len(result) == 0:
-                    return None
-                else:
-                    return result
+        cached = notify_role_cache.get(guild_id)
+        if cached is MISSING:
+            result = await fetch_scalars(NOTIFY_ROLE_IDS, {"guild_id": guild_id})
+            cached = result or None
+            notify_role_cache.set(guild_id, cached)
+
+        # 呼び出し元が変更してもキャッシュに影響しないようにコピーを返す
+        return list(cached) if cached is not None else None
 
 
 if __name__ == "__main__":
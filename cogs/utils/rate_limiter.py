@@ -0,0 +1,247 @@
+"""
+Discord APIへのリクエストを調整するトークンバケット式レートリミッター
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import AsyncIterator, Dict, Iterator, Optional, Tuple
+
+import discord
+
+
+class Lane(IntEnum):
+    """API呼び出しの優先度（値が小さいほど優先）"""
+
+    INTERACTION = 0  # インタラクションへの応答
+    USER = 1  # ユーザーのコマンドによる処理
+    BACKGROUND = 2  # 定期メンテナンスなどのバックグラウンド処理
+
+
+@dataclass(frozen=True)
+class BucketSpec:
+    capacity: float  # バースト可能なリクエスト数
+    refill_per_second: float  # 1秒あたりの回復量
+
+
+# ルートごとの既定値（サーバー単位で適用）
+DEFAULT_BUCKETS: Dict[str, BucketSpec] = {
+    "thread_edit": BucketSpec(capacity=5, refill_per_second=0.5),
+    "thread_join": BucketSpec(capacity=5, refill_per_second=1.0),
+    "message_send": BucketSpec(capacity=5, refill_per_second=1.0),
+    "message_edit": BucketSpec(capacity=5, refill_per_second=1.0),
+    "channel_fetch": BucketSpec(capacity=5, refill_per_second=1.0),
+    "interaction_response": BucketSpec(capacity=50, refill_per_second=50.0),
+}
+FALLBACK_BUCKET = BucketSpec(capacity=5, refill_per_second=1.0)
+
+
+class TokenBucket:
+    """1つのルート・サーバーに対応するバケット
+
+    429を受けると回復速度を半分にし、成功するたびに既定値まで少しずつ戻す。
+    """
+
+    def __init__(self, spec: BucketSpec) -> None:
+        self.spec = spec
+        self.tokens = spec.capacity
+        self.refill_per_second = spec.refill_per_second
+        self.blocked_until = 0.0
+        self.waiting: Counter[Lane] = Counter()  # レーンごとの待機数
+        self._updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self.tokens = min(
+            self.spec.capacity, self.tokens + elapsed * self.refill_per_second
+        )
+
+    def reserve(self) -> float:
+        """トークンを1つ取得する
+
+        Returns:
+            float: 取得できた場合は0、できなかった場合は次に取得できるまでの秒数
+        """
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.refill_per_second
+
+    def penalize(self, retry_after: float) -> None:
+        """429を受けたときに呼ぶ"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        self.tokens = 0
+        self.refill_per_second = max(
+            self.refill_per_second / 2, self.spec.refill_per_second / 8
+        )
+
+    def reward(self) -> None:
+        """リクエストが成功したときに呼ぶ"""
+        self.refill_per_second = min(
+            self.spec.refill_per_second,
+            self.refill_per_second + self.spec.refill_per_second / 10,
+        )
+
+
+# 実行中のリクエストが使っているバケット（429ログとの対応付けに使う）
+_active_bucket: ContextVar[Optional[TokenBucket]] = ContextVar(
+    "_active_bucket", default=None
+)
+
+# 現在の処理のレーン（指定がなければユーザー操作として扱う）
+_current_lane: ContextVar[Lane] = ContextVar("_current_lane", default=Lane.USER)
+
+
+class _RateLimitLogHandler(logging.Handler):
+    """discord.httpの429警告ログからリトライ待ち時間を学習するハンドラー
+
+    discord.pyはリクエスト元のタスク内でログを出すため、
+    ContextVarから該当するバケットを特定できる。
+    """
+
+    def __init__(self, limiter: "RateLimiter") -> None:
+        super().__init__(level=logging.WARNING)
+        self.limiter = limiter
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if not isinstance(record.msg, str) or not record.args:
+            return
+        args = record.args if isinstance(record.args, tuple) else (record.args,)
+        try:
+            if record.msg.startswith("Global rate limit has been hit"):
+                self.limiter.pause_all(float(args[0]))
+            elif record.msg.startswith("We are being rate limited"):
+                bucket = _active_bucket.get()
+                if bucket is not None:
+                    bucket.penalize(float(args[2]))
+                    self.limiter.throttled += 1
+        except (IndexError, TypeError, ValueError):
+            pass
+
+
+class RateLimiter:
+    """ルート・サーバー単位でAPI呼び出しを調整するクラス
+
+    使い方:
+        async with rate_limiter.slot("thread_edit", thread.guild.id):
+            await thread.edit(...)
+
+    同じバケットでは上位レーンの待機がある間は下位レーンにトークンを渡さない。
+    さらにBACKGROUNDレーンは、どこかで上位レーンが待機している間は譲る。
+    """
+
+    def __init__(self, buckets: Optional[Dict[str, BucketSpec]] = None) -> None:
+        self.specs = dict(DEFAULT_BUCKETS if buckets is None else buckets)
+        self._buckets: Dict[Tuple[str, Optional[int]], TokenBucket] = {}
+        self._waiting: Counter[Lane] = Counter()
+        self._lane_changed = asyncio.Condition()
+        self.granted: Counter[Lane] = Counter()  # レーンごとの取得回数
+        self.throttled = 0  # 429を受けた回数
+
+    def install(self, logger_name: str = "discord.http") -> None:
+        """discord.pyのレートリミットログを購読する（重複登録はしない）"""
+        logger = logging.getLogger(logger_name)
+        if not any(isinstance(h, _RateLimitLogHandler) for h in logger.handlers):
+            logger.addHandler(_RateLimitLogHandler(self))
+
+    def bucket(self, route: str, guild_id: Optional[int] = None) -> TokenBucket:
+        key = (route, guild_id)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.specs.get(route, FALLBACK_BUCKET))
+            self._buckets[key] = bucket
+        return bucket
+
+    def pause_all(self, retry_after: float) -> None:
+        """グローバルレートリミット時にすべてのバケットを止める"""
+        for bucket in self._buckets.values():
+            bucket.penalize(retry_after)
+
+    @staticmethod
+    @contextmanager
+    def lane(lane: Lane) -> Iterator[None]:
+        """ブロック内のAPI呼び出しのレーンを指定する"""
+        token = _current_lane.set(lane)
+        try:
+            yield
+        finally:
+            _current_lane.reset(token)
+
+    def _must_yield(self, bucket: TokenBucket, lane: Lane) -> bool:
+        """上位レーンに順番を譲るべきかどうか"""
+        higher = range(lane)
+        if any(bucket.waiting[h] for h in higher):
+            return True
+        return lane == Lane.BACKGROUND and any(self._waiting[h] for h in higher)
+
+    async def acquire(
+        self,
+        route: str,
+        guild_id: Optional[int] = None,
+        lane: Optional[Lane] = None,
+    ) -> TokenBucket:
+        """トークンを取得できるまで待機する"""
+        lane = _current_lane.get() if lane is None else lane
+        bucket = self.bucket(route, guild_id)
+        bucket.waiting[lane] += 1
+        self._waiting[lane] += 1
+        try:
+            while True:
+                if self._must_yield(bucket, lane):
+                    async with self._lane_changed:
+                        await self._lane_changed.wait_for(
+                            lambda: not self._must_yield(bucket, lane)
+                        )
+                    continue
+
+                wait = bucket.reserve()
+                if wait <= 0:
+                    self.granted[lane] += 1
+                    return bucket
+                await asyncio.sleep(wait)
+        finally:
+            bucket.waiting[lane] -= 1
+            self._waiting[lane] -= 1
+            async with self._lane_changed:
+                self._lane_changed.notify_all()
+
+    def pending(self) -> Dict[str, int]:
+        """レーンごとの待機数を取得する"""
+        return {lane.name: self._waiting[lane] for lane in Lane}
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        route: str,
+        guild_id: Optional[int] = None,
+        lane: Optional[Lane] = None,
+    ) -> AsyncIterator[TokenBucket]:
+        """トークンを取得してからブロック内のAPI呼び出しを行う"""
+        bucket = await self.acquire(route, guild_id, lane)
+        token = _active_bucket.set(bucket)
+        try:
+            yield bucket
+        except discord.RateLimited as e:
+            bucket.penalize(e.retry_after)
+            self.throttled += 1
+            raise
+        else:
+            bucket.reward()
+        finally:
+            _active_bucket.reset(token)
+
+
+# 全Cog共通のレートリミッター
+rate_limiter = RateLimiter()
+rate_limiter.install()
@@ -2,24 +2,24 @@
 リマインド除外設定管理
 """
 
+import asyncio
 import json
-from dataclasses import dataclass
-from typing import List, Optional
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
-from sqlalchemy import delete, select
+from sqlalchemy import Index, delete, select
 from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.sql import Executable
 from sqlalchemy.schema import Column
 from sqlalchemy.types import BigInteger, Boolean, String
 
 try:
-    from .db import engine
+    from .db import Base, engine
+    from .db_writer import db_writer
 except ImportError:
-    from db import engine
-    from thread_channels import Base
-
-Base = declarative_base()
+    from db import Base, engine
+    from db_writer import db_writer
 
 
 @dataclass
@@ -41,16 +41,92 @@ class ReminderExclusionDB(Base):
     reminder_weeks = Column(BigInteger, default=4)  # デフォルトは4週間
     roles = Column(String, default="[]")  # メンション対象ロールIDリスト(JSON文字列)
 
+    __table_args__ = (
+        # get_exclusions_by_guild用（主キーは(channel_id, guild_id)の順のため）
+        Index("ix_reminder_exclusions_guild_id", "guild_id"),
+    )
+
+
+class ExclusionIndex:
+    """除外設定をサーバー → チャンネル → 設定の順に保持するインデックス
+
+    rolesはデコード済みのリストで保持する。
+    put/discardのたびに、登録されたリスナーへ変更のあった(チャンネルID, サーバーID)を通知する。
+    """
+
+    def __init__(self) -> None:
+        self._guilds: Dict[int, Dict[int, ReminderExclusion]] = {}
+        self._listeners: List[Callable[[int, int], None]] = []
+        self.loaded = False
+        self.load_lock = asyncio.Lock()
+
+    def add_listener(self, listener: Callable[[int, int], None]) -> None:
+        """設定の変更時に呼ばれる関数を登録する"""
+        self._listeners.append(listener)
+
+    def _notify(self, channel_id: int, guild_id: int) -> None:
+        for listener in self._listeners:
+            listener(channel_id, guild_id)
+
+    def load(self, exclusions: Iterable[ReminderExclusion]) -> None:
+        """全件を読み込む（既存の内容は破棄）"""
+        self._guilds = {}
+        for exclusion in exclusions:
+            self._set(exclusion)
+        self.loaded = True
+
+    def _set(self, exclusion: ReminderExclusion) -> None:
+        self._guilds.setdefault(exclusion.guild_id, {})[exclusion.channel_id] = (
+            exclusion
+        )
+
+    def put(self, exclusion: ReminderExclusion) -> None:
+        self._set(exclusion)
+        self._notify(exclusion.channel_id, exclusion.guild_id)
+
+    def discard(self, channel_id: int, guild_id: int) -> None:
+        channels = self._guilds.get(guild_id)
+        if channels is None:
+            return
+        if channels.pop(channel_id, None) is None:
+            return
+        if not channels:
+            del self._guilds[guild_id]
+        self._notify(channel_id, guild_id)
+
+    def get(self, channel_id: int, guild_id: int) -> Optional[ReminderExclusion]:
+        return self._guilds.get(guild_id, {}).get(channel_id)
+
+    def guild(self, guild_id: int) -> List[ReminderExclusion]:
+        return list(self._guilds.get(guild_id, {}).values())
+
+    def resolve(
+        self, channel_id: int, guild_id: int, parent_channel_id: Optional[int] = None
+    ) -> Optional[ReminderExclusion]:
+        """スレッド自身の設定、なければ子にも適用される親チャンネルの設定を返す"""
+        channels = self._guilds.get(guild_id)
+        if not channels:
+            return None
+
+        exclusion = channels.get(channel_id)
+        if exclusion is not None:
+            return exclusion
+
+        if parent_channel_id:
+            parent = channels.get(parent_channel_id)
+            if parent is not None and parent.exclude_children:
+                return parent
+        return None
+
+
+# 全マネージャー共通の除外設定インデックス
+exclusion_index = ExclusionIndex()
+
 
 class ReminderExclusionManager:
     def __init__(self) -> None:
         pass
 
-    async def create_table(self) -> None:
-        """テーブルを作成する関数"""
-        async with engine.begin() as conn:
-            await conn.run_sync(ReminderExclusionDB.metadata.create_all)
-
     @staticmethod
     def parse_roles(roles_field) -> list[int]:
         """rolesカラム(JSON文字列)をlist[int]に変換"""
@@ -81,6 +157,34 @@ class ReminderExclusionManager:
         )
         return processed_data
 
+    @staticmethod
+    def _copy(exclusion: ReminderExclusion) -> ReminderExclusion:
+        """インデックス内の設定を呼び出し元が変更しないようにコピーする"""
+        roles = list(exclusion.roles) if exclusion.roles is not None else None
+        return replace(exclusion, roles=roles)
+
+    async def load_index(self) -> int:
+        """除外設定を全件読み込んでインデックスを作り直す関数
+
+        Returns:
+            int: 読み込んだ件数
+        """
+        async with AsyncSession(engine) as session:
+            async with session.begin():
+                result = await session.execute(select(ReminderExclusionDB))
+                exclusions = [self.return_dataclass(row) for row in result.fetchall()]
+
+        exclusion_index.load(exclusions)
+        return len(exclusions)
+
+    async def _ensure_index(self) -> None:
+        """インデックスが未読み込みなら読み込む"""
+        if exclusion_index.loaded:
+            return
+        async with exclusion_index.load_lock:
+            if not exclusion_index.loaded:
+                await self.load_index()
+
     async def add_exclusion(
         self,
         channel_id: int,
@@ -92,42 +196,54 @@ class ReminderExclusionManager:
     ) -> None:
         """除外設定を追加する関数"""
         try:
-            async with AsyncSession(engine) as session:
-                async with session.begin():
-                    stmt = insert(ReminderExclusionDB).values(
-                        channel_id=channel_id,
-                        guild_id=guild_id,
-                        exclude_type=exclude_type,
-                        reminder_weeks=reminder_weeks,
-                        exclude_children=exclude_children,
-                        roles=self.dump_roles(roles),
-                    )
-
-                    do_update_stmt = stmt.on_conflict_do_update(
-                        index_elements=["channel_id", "guild_id"],
-                        set_=dict(
-                            exclude_type=exclude_type,
-                            reminder_weeks=reminder_weeks,
-                            exclude_children=exclude_children,
-                            roles=self.dump_roles(roles),
-                        ),
-                    )
-                    await session.execute(do_update_stmt)
+            exclusion = ReminderExclusion(
+                channel_id=channel_id,
+                guild_id=guild_id,
+                exclude_type=exclude_type,
+                exclude_children=exclude_children,
+                reminder_weeks=reminder_weeks,
+                roles=list(roles) if roles is not None else [],
+            )
+            await db_writer.execute(self.build_add_exclusion(exclusion))
+            exclusion_index.put(exclusion)
         except Exception as e:
             print(f"Error in add_exclusion: {e}")
             raise e
 
+    def build_add_exclusion(self, exclusion: ReminderExclusion) -> Executable:
+        """add_exclusionのupsert文を作る関数（他の書き込みとまとめてコミットする場合に使う）
+
+        コミット後にexclusion_index.putが必要
+        """
+        stmt = insert(ReminderExclusionDB).values(
+            channel_id=exclusion.channel_id,
+            guild_id=exclusion.guild_id,
+            exclude_type=exclusion.exclude_type,
+            reminder_weeks=exclusion.reminder_weeks,
+            exclude_children=exclusion.exclude_children,
+            roles=self.dump_roles(exclusion.roles),
+        )
+
+        return stmt.on_conflict_do_update(
+            index_elements=["channel_id", "guild_id"],
+            set_=dict(
+                exclude_type=exclusion.exclude_type,
+                reminder_weeks=exclusion.reminder_weeks,
+                exclude_children=exclusion.exclude_children,
+                roles=self.dump_roles(exclusion.roles),
+            ),
+        )
+
     async def remove_exclusion(self, channel_id: int, guild_id: int) -> bool:
         """除外設定を削除する関数"""
         try:
-            async with AsyncSession(engine) as session:
-                async with session.begin():
-                    stmt = delete(ReminderExclusionDB).where(
-                        ReminderExclusionDB.channel_id == channel_id,
-                        ReminderExclusionDB.guild_id == guild_id,
-                    )
-                    result = await session.execute(stmt)
-                    return result.rowcount > 0
+            stmt = delete(ReminderExclusionDB).where(
+                ReminderExclusionDB.channel_id == channel_id,
+                ReminderExclusionDB.guild_id == guild_id,
+            )
+            (rowcount,) = await db_writer.execute(stmt)
+            exclusion_index.discard(channel_id, guild_id)
+            return rowcount > 0
         except Exception as e:
             # ログ出力などのエラーハンドリングを追加可能
             raise e
@@ -137,60 +253,45 @@ class ReminderExclusionManager:
     ) -> bool:
         """チャンネル/スレッドが除外されているかチェック"""
         try:
-            async with AsyncSession(engine) as session:
-                async with session.begin():
-                    # 直接的な除外設定をチェック
-                    stmt = select(ReminderExclusionDB).where(
-                        ReminderExclusionDB.channel_id == channel_id,
-                        ReminderExclusionDB.guild_id == guild_id,
-                    )
-                    result = await session.execute(stmt)
-                    if result.fetchone():
-                        return True
-
-                    # 親チャンネルの除外設定をチェック（スレッドの場合）
-                    if parent_channel_id:
-                        stmt = select(ReminderExclusionDB).where(
-                            ReminderExclusionDB.channel_id == parent_channel_id,
-                            ReminderExclusionDB.guild_id == guild_id,
-                            ReminderExclusionDB.exclude_children,
-                        )
-                        result = await session.execute(stmt)
-                        if result.fetchone():
-                            return True
-
-                    return False
+            await self._ensure_index()
+            # 直接的な除外設定、なければ親チャンネルの除外設定をチェック
+            exclusion = exclusion_index.resolve(channel_id, guild_id, parent_channel_id)
+            return exclusion is not None
         except Exception:
             # エラーが発生した場合は安全側に倒して除外しない
             return False
 
+    async def resolve_many(
+        self, threads: Iterable[Tuple[int, Optional[int], int]]
+    ) -> Dict[int, Optional[ReminderExclusion]]:
+        """複数スレッドの除外設定をまとめて解決する関数
+
+        インデックスが読み込み済みならDBにはアクセスせず、未読み込みでも1回の読み込みで済む。
+
+        Args:
+            threads: (スレッドID, 親チャンネルID, サーバーID)のリスト
+
+        Returns:
+            Dict[int, Optional[ReminderExclusion]]: スレッドIDごとの適用される設定（除外されていなければNone）
+        """
+        await self._ensure_index()
+        return {
+            thread_id: exclusion_index.resolve(thread_id, guild_id, parent_id)
+            for thread_id, parent_id, guild_id in threads
+        }
+
     async def get_exclusions_by_guild(
         self, guild_id: int
     ) -> Optional[List[ReminderExclusion]]:
         """ギルドの除外設定一覧を取得"""
         try:
-            async with AsyncSession(engine) as session:
-                async with session.begin():
-                    stmt = select(ReminderExclusionDB).where(
-                        ReminderExclusionDB.guild_id == guild_id
-                    )
-                    result = await session.execute(stmt)
-                    exclusions = result.fetchall()
-
-                    if not exclusions:
-                        return None
-
-                    return [
-                        ReminderExclusion(
-                            channel_id=exc[0].channel_id,
-                            guild_id=exc[0].guild_id,
-                            exclude_type=exc[0].exclude_type,
-                            exclude_children=exc[0].exclude_children,
-                            reminder_weeks=exc[0].reminder_weeks,
-                            roles=self.parse_roles(getattr(exc[0], "roles", None)),
-                        )
-                        for exc in exclusions
-                    ]
+            await self._ensure_index()
+            exclusions = exclusion_index.guild(guild_id)
+
+            if not exclusions:
+                return None
+
+            return [self._copy(exclusion) for exclusion in exclusions]
         except Exception:
             # エラーが発生した場合は空のリストを返す
             return None
@@ -210,26 +311,13 @@ class ReminderExclusionManager:
     ) -> Optional[ReminderExclusion]:
         """特定の除外設定を取得"""
         try:
-            async with AsyncSession(engine) as session:
-                async with session.begin():
-                    stmt = select(ReminderExclusionDB).where(
-                        ReminderExclusionDB.channel_id == channel_id,
-                        ReminderExclusionDB.guild_id == guild_id,
-                    )
-                    result = await session.execute(stmt)
-                    exclusion = result.fetchone()
-
-                    if not exclusion:
-                        return None
-
-                    return ReminderExclusion(
-                        channel_id=exclusion[0].channel_id,
-                        guild_id=exclusion[0].guild_id,
-                        exclude_type=exclusion[0].exclude_type,
-                        exclude_children=exclusion[0].exclude_children,
-                        reminder_weeks=exclusion[0].reminder_weeks,
-                        roles=self.parse_roles(getattr(exclusion[0], "roles", None)),
-                    )
+            await self._ensure_index()
+            exclusion = exclusion_index.get(channel_id, guild_id)
+
+            if not exclusion:
+                return None
+
+            return self._copy(exclusion)
         except Exception as e:
             print(f"Error fetching exclusion: {e}")
             return None
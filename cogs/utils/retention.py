@@ -0,0 +1,402 @@
+"""
+保持期間を過ぎた行の削除とDBファイルの切り詰め
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import (
+    Awaitable,
+    Callable,
+    Collection,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import discord
+from sqlalchemy import delete, exists, select, tuple_
+from sqlalchemy.sql import ColumnElement
+
+try:
+    from .db import db_config, engine
+    from .db_writer import db_writer
+    from .fast_query import iter_keyset
+    from .guild_setting import GuildSettingDB
+    from .notify_role import NotifyRoleDB
+    from .reminder_exclusions import ReminderExclusionDB, exclusion_index
+    from .scheduled_closures import ScheduledClosureDB, closure_deadlines
+    from .setting_cache import keep_all_cache, notify_role_cache
+    from .thread_activity import ThreadActivityDB, activity_tracker
+    from .thread_channels import ChannelDataDB, archive_deadlines
+    from .thread_config import ThreadKeeperConfig
+except ImportError:
+    from db import db_config, engine
+    from db_writer import db_writer
+    from fast_query import iter_keyset
+    from guild_setting import GuildSettingDB
+    from notify_role import NotifyRoleDB
+    from reminder_exclusions import ReminderExclusionDB, exclusion_index
+    from scheduled_closures import ScheduledClosureDB, closure_deadlines
+    from setting_cache import keep_all_cache, notify_role_cache
+    from thread_activity import ThreadActivityDB, activity_tracker
+    from thread_channels import ChannelDataDB, archive_deadlines
+    from thread_config import ThreadKeeperConfig
+
+Key = Tuple[int, ...]
+
+
+@dataclass
+class _Target:
+    """削除対象のテーブルと、削除した行に対応するメモリ上の状態の片付け"""
+
+    model: type
+    keys: Tuple[ColumnElement, ...]  # 行を一意に特定する列
+    guild_id: ColumnElement
+    forget: Callable[[Sequence[Key]], None]
+
+    @property
+    def name(self) -> str:
+        return self.model.__tablename__
+
+
+def _forget_channels(keys: Sequence[Key]) -> None:
+    for channel_id, guild_id in keys:
+        archive_deadlines.unschedule((channel_id, guild_id))
+
+
+def _forget_closures(keys: Sequence[Key]) -> None:
+    for (thread_id,) in keys:
+        closure_deadlines.unschedule(thread_id)
+
+
+def _forget_exclusions(keys: Sequence[Key]) -> None:
+    for channel_id, guild_id in keys:
+        exclusion_index.discard(channel_id, guild_id)
+
+
+def _forget_activity(keys: Sequence[Key]) -> None:
+    activity_tracker.forget(thread_id for (thread_id,) in keys)
+
+
+def _forget_notify_roles(keys: Sequence[Key]) -> None:
+    for guild_id, _ in keys:
+        notify_role_cache.invalidate(guild_id)
+
+
+def _forget_guild_settings(keys: Sequence[Key]) -> None:
+    for (guild_id,) in keys:
+        keep_all_cache.invalidate(guild_id)
+
+
+CHANNELS = _Target(
+    ChannelDataDB,
+    (ChannelDataDB.channel_id, ChannelDataDB.guild_id),
+    ChannelDataDB.guild_id,
+    _forget_channels,
+)
+CLOSURES = _Target(
+    ScheduledClosureDB,
+    (ScheduledClosureDB.thread_id,),
+    ScheduledClosureDB.guild_id,
+    _forget_closures,
+)
+EXCLUSIONS = _Target(
+    ReminderExclusionDB,
+    (ReminderExclusionDB.channel_id, ReminderExclusionDB.guild_id),
+    ReminderExclusionDB.guild_id,
+    _forget_exclusions,
+)
+ACTIVITY = _Target(
+    ThreadActivityDB,
+    (ThreadActivityDB.thread_id,),
+    ThreadActivityDB.guild_id,
+    _forget_activity,
+)
+NOTIFY_ROLES = _Target(
+    NotifyRoleDB,
+    (NotifyRoleDB.guild_id, NotifyRoleDB.id),
+    NotifyRoleDB.guild_id,
+    _forget_notify_roles,
+)
+GUILD_SETTINGS = _Target(
+    GuildSettingDB,
+    (GuildSettingDB.guild_id,),
+    GuildSettingDB.guild_id,
+    _forget_guild_settings,
+)
+
+# サーバー単位で削除するテーブル（guild_settingは最後に消す）
+GUILD_TARGETS: List[_Target] = [
+    CHANNELS,
+    CLOSURES,
+    EXCLUSIONS,
+    ACTIVITY,
+    NOTIFY_ROLES,
+    GUILD_SETTINGS,
+]
+
+
+def _naive_utc(value: datetime) -> datetime:
+    """DBに保存しているnaiveなUTCの時刻と比較できるようにする"""
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+@dataclass
+class RetentionReport:
+    deleted: Dict[str, int] = field(default_factory=dict)  # テーブルごとの削除行数
+    guilds_purged: int = 0
+    pages_reclaimed: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def total_deleted(self) -> int:
+        return sum(self.deleted.values())
+
+
+class RetentionEngine:
+    """保持期間を過ぎた行を少しずつ削除するクラス
+
+    - 保守を外してから `unkept_channel_days` 日経ったchannel_settingの行
+    - 最後の発言から `gone_thread_days` 日経ち、削除されたことを確認できたスレッドの
+      スレッド単位の除外設定
+    - 最後の発言から `gone_thread_days` 日経った保守対象外のスレッドの発言記録
+    - botが抜けたサーバーの全テーブルの行
+
+    書き込みロックを長く持たないように `batch_size` 行ずつ削除し、
+    最後にincremental vacuumで空いたページを `vacuum_max_pages` ページまで
+    DBファイルから切り詰める（auto_vacuumがINCREMENTALのDBのみ）。
+    """
+
+    def __init__(
+        self,
+        unkept_channel_days: int,
+        gone_thread_days: int,
+        batch_size: int,
+        vacuum_max_pages: int = 0,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        self.unkept_channel_days = unkept_channel_days
+        self.gone_thread_days = gone_thread_days
+        self.batch_size = batch_size
+        self.vacuum_max_pages = vacuum_max_pages
+        self.logger = logger or logging.getLogger("discord")
+        self.last_report: Optional[RetentionReport] = None
+
+    async def _delete_keys(self, target: _Target, keys: Sequence[Key]) -> int:
+        if not keys:
+            return 0
+        stmt = delete(target.model).where(tuple_(*target.keys).in_(keys))
+        (rowcount,) = await db_writer.execute(stmt)
+        target.forget(keys)
+        return rowcount
+
+    async def _delete_where(self, target: _Target, where: ColumnElement) -> int:
+        """条件に合う行をbatch_size行ずつ削除する"""
+        stmt = select(*target.keys).where(where).limit(self.batch_size)
+        total = 0
+        while True:
+            async with engine.connect() as conn:
+                result = await conn.execute(stmt)
+                keys = [tuple(row) for row in result]
+
+            deleted = await self._delete_keys(target, keys)
+            total += deleted
+            if len(keys) < self.batch_size or deleted == 0:
+                return total
+            # バッチの間に他の書き込みを通す
+            await asyncio.sleep(0)
+
+    async def _delete_at_once(
+        self, deletions: Sequence[Tuple[_Target, ColumnElement]]
+    ) -> Dict[str, int]:
+        """複数のテーブルから条件に合う行を1トランザクションで削除する
+
+        Returns:
+            Dict[str, int]: テーブルごとの削除行数
+        """
+        async with engine.connect() as conn:
+            keys = []
+            for target, where in deletions:
+                result = await conn.execute(select(*target.keys).where(where))
+                keys.append([tuple(row) for row in result])
+
+        rowcounts = await db_writer.execute(
+            *(delete(target.model).where(where) for target, where in deletions)
+        )
+        for (target, _), target_keys in zip(deletions, keys):
+            target.forget(target_keys)
+        return {
+            target.name: rowcount for (target, _), rowcount in zip(deletions, rowcounts)
+        }
+
+    async def drop_thread(self, thread_id: int, guild_id: int) -> Dict[str, int]:
+        """削除されたスレッドの行を1トランザクションで削除する"""
+        return await self._delete_at_once(
+            [
+                (
+                    CHANNELS,
+                    (ChannelDataDB.channel_id == thread_id)
+                    & (ChannelDataDB.guild_id == guild_id),
+                ),
+                (CLOSURES, ScheduledClosureDB.thread_id == thread_id),
+                (
+                    EXCLUSIONS,
+                    (ReminderExclusionDB.channel_id == thread_id)
+                    & (ReminderExclusionDB.guild_id == guild_id),
+                ),
+                (ACTIVITY, ThreadActivityDB.thread_id == thread_id),
+            ]
+        )
+
+    async def drop_guild(self, guild_id: int) -> Dict[str, int]:
+        """抜けたサーバーの行を全テーブルから1トランザクションで削除する"""
+        return await self._delete_at_once(
+            [(target, target.guild_id == guild_id) for target in GUILD_TARGETS]
+        )
+
+    async def purge_unkept_channels(self, now: datetime) -> int:
+        """保守を外してから保持期間を過ぎたチャンネルの行を削除する"""
+        cutoff = _naive_utc(now - timedelta(days=self.unkept_channel_days))
+        return await self._delete_where(
+            CHANNELS, ~ChannelDataDB.keep & (ChannelDataDB.unkept_at < cutoff)
+        )
+
+    async def purge_gone_thread_exclusions(
+        self, now: datetime, is_deleted: Callable[[int, int], Awaitable[bool]]
+    ) -> int:
+        """削除されて保持期間を過ぎたスレッドの除外設定を削除する
+
+        発言記録がないスレッドはスレッドの作成時刻を最後の発言とみなす。
+        アーカイブされただけのスレッドを消さないよう、保持期間を過ぎた行だけ
+        `is_deleted` で削除を確認する。
+        """
+        cutoff = now - timedelta(days=self.gone_thread_days)
+        stmt = (
+            select(
+                ReminderExclusionDB.channel_id,
+                ReminderExclusionDB.guild_id,
+                ThreadActivityDB.last_message_at,
+            )
+            .outerjoin(
+                ThreadActivityDB,
+                ThreadActivityDB.thread_id == ReminderExclusionDB.channel_id,
+            )
+            .where(ReminderExclusionDB.exclude_type == "thread")
+        )
+
+        total = 0
+        stale: List[Key] = []
+        async for channel_id, guild_id, last_message_at in iter_keyset(
+            stmt, EXCLUSIONS.keys, lambda *row: row, self.batch_size
+        ):
+            if last_message_at is not None:
+                last_seen = last_message_at.replace(tzinfo=timezone.utc)
+            else:
+                last_seen = discord.utils.snowflake_time(channel_id)
+            if last_seen < cutoff and await is_deleted(channel_id, guild_id):
+                stale.append((channel_id, guild_id))
+            if len(stale) >= self.batch_size:
+                total += await self._delete_keys(EXCLUSIONS, stale)
+                stale = []
+
+        total += await self._delete_keys(EXCLUSIONS, stale)
+        return total
+
+    async def purge_stale_activity(self, now: datetime) -> int:
+        """保守対象外で保持期間を過ぎたスレッドの発言記録を削除する"""
+        cutoff = _naive_utc(now - timedelta(days=self.gone_thread_days))
+        kept = exists().where(
+            ChannelDataDB.channel_id == ThreadActivityDB.thread_id,
+            ChannelDataDB.guild_id == ThreadActivityDB.guild_id,
+            ChannelDataDB.keep,
+        )
+        return await self._delete_where(
+            ACTIVITY, (ThreadActivityDB.last_message_at < cutoff) & ~kept
+        )
+
+    async def purge_guild(self, guild_id: int) -> Dict[str, int]:
+        """サーバーの行を全テーブルから削除する
+
+        Returns:
+            Dict[str, int]: テーブルごとの削除行数
+        """
+        return {
+            target.name: await self._delete_where(target, target.guild_id == guild_id)
+            for target in GUILD_TARGETS
+        }
+
+    async def purge_left_guilds(
+        self, active_guild_ids: Collection[int]
+    ) -> Dict[int, Dict[str, int]]:
+        """botが抜けたサーバーの行を削除する
+
+        Returns:
+            Dict[int, Dict[str, int]]: サーバーIDごとの削除行数
+        """
+        # サーバー一覧を取得できていない場合に全サーバーを消さないようにする
+        if not active_guild_ids:
+            return {}
+
+        async with engine.connect() as conn:
+            known = list(await conn.scalars(select(GuildSettingDB.guild_id)))
+
+        active = set(active_guild_ids)
+        return {
+            guild_id: await self.purge_guild(guild_id)
+            for guild_id in known
+            if guild_id not in active
+        }
+
+    async def run(
+        self,
+        active_guild_ids: Collection[int],
+        is_deleted: Callable[[int, int], Awaitable[bool]],
+    ) -> RetentionReport:
+        """すべてのポリシーを適用し、空いたページを切り詰める
+
+        Args:
+            active_guild_ids (Collection[int]): botが参加しているサーバーのID
+            is_deleted (Callable[[int, int], Awaitable[bool]]): (スレッドID, サーバーID)の
+                スレッドが削除されたことを確認できたかどうか
+        """
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        deleted: Counter[str] = Counter()
+
+        deleted[CHANNELS.name] += await self.purge_unkept_channels(now)
+        deleted[EXCLUSIONS.name] += await self.purge_gone_thread_exclusions(
+            now, is_deleted
+        )
+        deleted[ACTIVITY.name] += await self.purge_stale_activity(now)
+        left = await self.purge_left_guilds(active_guild_ids)
+        for counts in left.values():
+            deleted.update(counts)
+
+        pages = await db_config.incremental_vacuum(self.vacuum_max_pages)
+
+        report = RetentionReport(
+            deleted={name: count for name, count in deleted.items() if count},
+            guilds_purged=len(left),
+            pages_reclaimed=pages,
+            elapsed_seconds=time.perf_counter() - started,
+        )
+        self.last_report = report
+        return report
+
+
+# 全Cog共通の保持期間管理
+retention_engine = RetentionEngine(
+    unkept_channel_days=ThreadKeeperConfig.RETENTION_UNKEPT_CHANNEL_DAYS,
+    gone_thread_days=ThreadKeeperConfig.RETENTION_GONE_THREAD_DAYS,
+    batch_size=ThreadKeeperConfig.RETENTION_BATCH_SIZE,
+    vacuum_max_pages=ThreadKeeperConfig.RETENTION_VACUUM_MAX_PAGES,
+)
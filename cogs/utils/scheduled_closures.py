@@ -1,25 +1,27 @@
 import asyncio
 from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 
-from sqlalchemy import delete, select
+from sqlalchemy import Index, bindparam, delete, select
 from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import declarative_base
 from sqlalchemy.schema import Column
 from sqlalchemy.types import BigInteger, DateTime
 
 try:
-    from .db import engine
+    from .db import Base, engine
+    from .db_writer import db_writer
+    from .deadline_queue import DeadlineQueue
+    from .fast_query import DEFAULT_PAGE_SIZE, fetch_one, iter_keyset
 except ImportError:
-    from db import engine
+    from db import Base, engine
+    from db_writer import db_writer
+    from deadline_queue import DeadlineQueue
+    from fast_query import DEFAULT_PAGE_SIZE, fetch_one, iter_keyset
 
 
-Base = declarative_base()
-
-
-@dataclass
+@dataclass(slots=True)
 class ScheduledClosure:
     thread_id: int
     guild_id: int
@@ -34,15 +36,35 @@ class ScheduledClosureDB(Base):
     scheduled_close_time = Column(DateTime, nullable=False)
     created_by = Column(BigInteger, nullable=False)
 
+    __table_args__ = (
+        # get_due_closures用
+        Index("ix_scheduled_closures_scheduled_close_time", "scheduled_close_time"),
+    )
+
+
+# 列の順番はScheduledClosureのフィールドの順に合わせる
+_CLOSURE_COLUMNS = (
+    ScheduledClosureDB.thread_id,
+    ScheduledClosureDB.guild_id,
+    ScheduledClosureDB.scheduled_close_time,
+    ScheduledClosureDB.created_by,
+)
+# get_closure用の文
+CLOSURE = select(*_CLOSURE_COLUMNS).where(
+    ScheduledClosureDB.thread_id == bindparam("thread_id")
+)
+# 予約時刻の順に読む（ix_scheduled_closures_scheduled_close_timeの順）
+_BY_CLOSE_TIME = (ScheduledClosureDB.scheduled_close_time, ScheduledClosureDB.thread_id)
+
+
+# 閉架予約の実行時刻（DBが正、こちらは起床タイミング用の写し）
+closure_deadlines: DeadlineQueue[int] = DeadlineQueue()
+
 
 class ScheduledClosureManager:
     def __init__(self) -> None:
         pass
 
-    async def create_table(self) -> None:
-        async with engine.begin() as conn:
-            await conn.run_sync(ScheduledClosureDB.metadata.create_all)
-
     @staticmethod
     def return_dataclass(data: ScheduledClosureDB) -> ScheduledClosure:
         db_data = data[0]
@@ -69,32 +91,56 @@ class ScheduledClosureManager:
         scheduled_close_time: datetime,
         created_by: int,
     ) -> None:
-        async with AsyncSession(engine) as session:
-            async with session.begin():
-                stmt = insert(ScheduledClosureDB).values(
-                    thread_id=thread_id,
-                    guild_id=guild_id,
-                    scheduled_close_time=scheduled_close_time,
-                    created_by=created_by,
-                )
-                do_update_stmt = stmt.on_conflict_do_update(
-                    index_elements=["thread_id"],
-                    set_=dict(
-                        guild_id=guild_id,
-                        scheduled_close_time=scheduled_close_time,
-                        created_by=created_by,
-                    ),
-                )
-                await session.execute(do_update_stmt)
+        stmt = insert(ScheduledClosureDB).values(
+            thread_id=thread_id,
+            guild_id=guild_id,
+            scheduled_close_time=scheduled_close_time,
+            created_by=created_by,
+        )
+        do_update_stmt = stmt.on_conflict_do_update(
+            index_elements=["thread_id"],
+            set_=dict(
+                guild_id=guild_id,
+                scheduled_close_time=scheduled_close_time,
+                created_by=created_by,
+            ),
+        )
+        await db_writer.execute(do_update_stmt)
+
+        # scheduled_close_timeはローカル時刻のnaive datetimeで保存されている
+        closure_deadlines.schedule(thread_id, scheduled_close_time.astimezone())
 
     async def cancel_closure(self, thread_id: int) -> bool:
-        async with AsyncSession(engine) as session:
-            async with session.begin():
-                stmt = delete(ScheduledClosureDB).where(
-                    ScheduledClosureDB.thread_id == thread_id
-                )
-                result = await session.execute(stmt)
-                return result.rowcount > 0
+        stmt = delete(ScheduledClosureDB).where(
+            ScheduledClosureDB.thread_id == thread_id
+        )
+        (rowcount,) = await db_writer.execute(stmt)
+        cancelled = rowcount > 0
+
+        closure_deadlines.unschedule(thread_id)
+        return cancelled
+
+    async def load_closure_deadlines(self) -> int:
+        """閉架予約の実行時刻をDBから読み込む関数
+
+        Returns:
+            int: 読み込んだ予約数
+        """
+        # 予約時刻の早い順に読むので、読み込み中でも先頭のページから閉架を実行できる
+        closure_deadlines.clear()
+        async for closure in self.iter_closures():
+            closure_deadlines.schedule(
+                closure.thread_id, closure.scheduled_close_time.astimezone()
+            )
+
+        return len(closure_deadlines)
+
+    def iter_closures(
+        self, page_size: int = DEFAULT_PAGE_SIZE
+    ) -> AsyncIterator[ScheduledClosure]:
+        """閉架予約を予約時刻の早い順に少しずつ読む関数"""
+        stmt = select(*_CLOSURE_COLUMNS)
+        return iter_keyset(stmt, _BY_CLOSE_TIME, ScheduledClosure, page_size)
 
     async def get_due_closures(self) -> Optional[List[ScheduledClosure]]:
         async with AsyncSession(engine) as session:
@@ -111,13 +157,4 @@ class ScheduledClosureManager:
                     return result
 
     async def get_closure(self, thread_id: int) -> Optional[ScheduledClosure]:
-        async with AsyncSession(engine) as session:
-            async with session.begin():
-                stmt = select(ScheduledClosureDB).where(
-                    ScheduledClosureDB.thread_id == thread_id
-                )
-                result = await session.execute(stmt)
-                result = result.fetchone()
-                if result is None:
-                    return None
-                return self.return_dataclass(result)
+        return await fetch_one(CLOSURE, {"thread_id": thread_id}, ScheduledClosure)
@@ -0,0 +1,75 @@
+"""
+サーバー設定と通知ロールのサーバー単位キャッシュ
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Generic, Hashable, Iterable, List, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+# キャッシュに値がないことを表す（Noneもキャッシュ対象の値なので区別する）
+MISSING = object()
+
+
+@dataclass
+class CacheStats:
+    name: str
+    size: int
+    hits: int
+    misses: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ReadThroughCache(Generic[K, V]):
+    """DBの読み取り結果を保持するキャッシュ
+
+    値の更新時はキャッシュを書き換えず、invalidateで破棄して次の読み取りでDBから取り直す。
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._values: Dict[K, V] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: K):
+        """キャッシュされた値を取得する（なければMISSINGを返す）"""
+        value = self._values.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def __contains__(self, key: K) -> bool:
+        """キャッシュ済みかどうか（ヒット率には数えない）"""
+        return key in self._values
+
+    def set(self, key: K, value: V) -> None:
+        self._values[key] = value
+
+    def load(self, entries: Iterable[Tuple[K, V]]) -> None:
+        """起動時にまとめて読み込む（既存のキャッシュは破棄）"""
+        self._values = dict(entries)
+
+    def invalidate(self, key: K) -> None:
+        self._values.pop(key, None)
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            name=self.name, size=len(self._values), hits=self.hits, misses=self.misses
+        )
+
+
+# サーバーごとの「全スレッドを延命するか」
+keep_all_cache: ReadThroughCache[int, bool] = ReadThroughCache("keep_all")
+
+# サーバーごとの通知ロール（未設定のサーバーはNone）
+notify_role_cache: ReadThroughCache[int, Optional[List[int]]] = ReadThroughCache(
+    "notify_roles"
+)
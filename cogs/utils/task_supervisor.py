@@ -0,0 +1,167 @@
+"""
+バックグラウンドループの死活監視
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from discord.ext import tasks
+
+
+@dataclass
+class _Supervised:
+    name: str
+    loop: tasks.Loop
+    stale_after: Optional[float]  # 秒（Noneなら停止のみ監視する）
+    last_iteration: int = 0
+    last_beat: Optional[float] = None  # time.monotonic()（最初の周回まではNone）
+    restarts: int = 0
+    consecutive_failures: int = 0
+    retry_at: float = 0.0
+    last_error: Optional[str] = None
+
+
+@dataclass
+class SupervisedTaskStats:
+    name: str
+    running: bool
+    restarts: int
+    seconds_since_heartbeat: Optional[float]
+    last_error: Optional[str]
+
+
+class TaskSupervisor:
+    """登録されたtasks.Loopを定期的に確認し、止まっていれば再起動するクラス
+
+    ループの周回数（current_loop）が増えたことをハートビートとみなす。
+    停止している、または `stale_after` 秒以上ハートビートがないループを再起動し、
+    続けて失敗する場合は再起動の間隔を指数的に延ばす。
+    before_loopでの待機を誤検知しないよう、経過時間は最初のハートビートから数える。
+
+    意図して止めるループは、止める前にunwatchしておくこと。
+    """
+
+    def __init__(
+        self,
+        check_interval_seconds: float = 30.0,
+        base_backoff_seconds: float = 5.0,
+        max_backoff_seconds: float = 600.0,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.check_interval_seconds = check_interval_seconds
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.logger = logger or logging.getLogger("discord")
+        self._loops: Dict[str, _Supervised] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def watch(
+        self, name: str, loop: tasks.Loop, stale_after: Optional[float] = None
+    ) -> None:
+        """ループを監視対象に登録する（同名の登録は置き換え、再起動回数は引き継ぐ）
+
+        Args:
+            name (str): 表示名
+            loop (tasks.Loop): 監視するループ（起動済みであること）
+            stale_after (Optional[float]): ハートビートがこの秒数途絶えたら再起動する。
+                次の期限まで待機し続けるループではNoneにする
+        """
+        previous = self._loops.get(name)
+        self._loops[name] = _Supervised(
+            name=name,
+            loop=loop,
+            stale_after=stale_after,
+            last_iteration=loop.current_loop,
+            restarts=previous.restarts if previous else 0,
+        )
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="task_supervisor")
+
+    def unwatch(self, *names: str) -> None:
+        for name in names:
+            self._loops.pop(name, None)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval_seconds)
+            try:
+                self.check()
+            except Exception as e:
+                self.logger.error(f"task_supervisor error: {e}")
+
+    def check(self) -> None:
+        """全ループを確認し、必要なものを再起動する"""
+        now = time.monotonic()
+        for entry in list(self._loops.values()):
+            loop = entry.loop
+            if loop.current_loop != entry.last_iteration:
+                entry.last_iteration = loop.current_loop
+                # 再起動で0に戻っただけなら周回とはみなさない
+                if loop.current_loop != 0:
+                    entry.last_beat = now
+                    entry.consecutive_failures = 0
+
+            running = loop.is_running()
+            stale = (
+                entry.stale_after is not None
+                and entry.last_beat is not None
+                and now - entry.last_beat > entry.stale_after
+            )
+            if (running and not stale) or now < entry.retry_at:
+                continue
+
+            if running:
+                reason = f"no heartbeat for {now - entry.last_beat:.0f}s"
+            else:
+                task = loop.get_task()
+                error = None
+                if task is not None and task.done() and not task.cancelled():
+                    error = task.exception()
+                entry.last_error = repr(error) if error is not None else None
+                reason = f"stopped ({entry.last_error or 'no error'})"
+
+            try:
+                if running:
+                    loop.restart()
+                else:
+                    loop.start()
+            except RuntimeError as e:
+                self.logger.error(
+                    f"task_supervisor: failed to restart {entry.name}: {e}"
+                )
+
+            entry.restarts += 1
+            entry.consecutive_failures += 1
+            entry.last_beat = None
+            backoff = min(
+                self.base_backoff_seconds * 2 ** (entry.consecutive_failures - 1),
+                self.max_backoff_seconds,
+            )
+            entry.retry_at = now + backoff
+            self.logger.warning(
+                f"task_supervisor: restarted {entry.name}, {reason} "
+                f"(restart #{entry.restarts}, next retry after {backoff:.0f}s)"
+            )
+
+    def stats(self) -> List[SupervisedTaskStats]:
+        now = time.monotonic()
+        return [
+            SupervisedTaskStats(
+                name=entry.name,
+                running=entry.loop.is_running(),
+                restarts=entry.restarts,
+                seconds_since_heartbeat=(
+                    now - entry.last_beat if entry.last_beat is not None else None
+                ),
+                last_error=entry.last_error,
+            )
+            for entry in self._loops.values()
+        ]
+
+
+# 全Cog共通の監視役
+task_supervisor = TaskSupervisor()
@@ -0,0 +1,329 @@
+"""
+スレッドごとの最終発言の記録
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import Index, select, text, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.schema import Column
+from sqlalchemy.types import BigInteger, DateTime
+
+try:
+    from .db import Base, engine
+    from .db_writer import db_writer
+    from .reminder_exclusions import (
+        ReminderExclusion,
+        ReminderExclusionManager,
+        exclusion_index,
+    )
+    from .thread_channels import ChannelDataDB
+    from .thread_config import ThreadKeeperConfig
+except ImportError:
+    from db import Base, engine
+    from db_writer import db_writer
+    from reminder_exclusions import (
+        ReminderExclusion,
+        ReminderExclusionManager,
+        exclusion_index,
+    )
+    from thread_channels import ChannelDataDB
+    from thread_config import ThreadKeeperConfig
+
+# 1文あたりのupsert件数（SQLiteのバインド変数の上限対策）
+FLUSH_CHUNK_SIZE = 500
+
+
+@dataclass
+class ThreadActivity:
+    thread_id: int
+    guild_id: int
+    parent_id: Optional[int]
+    last_message_id: int  # botを含む最後のメッセージ
+    last_message_at: datetime
+    last_human_message_id: Optional[int] = None  # bot以外の最後のメッセージ
+    last_human_message_at: Optional[datetime] = None
+    next_reminder_at: Optional[datetime] = None  # リマインドしない場合はNone
+
+
+class ThreadActivityDB(Base):
+    __tablename__ = "thread_activity"
+    thread_id = Column(BigInteger, primary_key=True)
+    guild_id = Column(BigInteger, nullable=False)
+    parent_id = Column(BigInteger, nullable=True)
+    last_message_id = Column(BigInteger, nullable=False)
+    last_message_at = Column(DateTime, nullable=False)  # UTC
+    last_human_message_id = Column(BigInteger, nullable=True)
+    last_human_message_at = Column(DateTime, nullable=True)  # UTC
+    next_reminder_at = Column(DateTime, nullable=True)  # UTC
+
+    __table_args__ = (
+        Index("ix_thread_activity_guild_id", "guild_id"),
+        # get_due_reminders用（リマインド対象のみの部分インデックス）
+        Index(
+            "ix_thread_activity_next_reminder_at",
+            "next_reminder_at",
+            sqlite_where=text("next_reminder_at IS NOT NULL"),
+        ),
+    )
+
+
+def reminder_weeks(exclusion: Optional[ReminderExclusion]) -> int:
+    """スレッドに適用されるリマインド期間（週）を取得する（0はリマインドしない）
+
+    スレッド自身の設定、子にも適用される親チャンネルの設定、既定値の順に優先する。
+    """
+    if exclusion is None:
+        return ThreadKeeperConfig.REMINDER_WEEKS
+    return exclusion.reminder_weeks
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """DBから読んだnaiveな時刻をUTCのawareな時刻にする"""
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+
+class ActivityTracker:
+    """on_messageで受け取った最終発言をメモリ上に保持するクラス
+
+    更新されたスレッドは書き出し待ちとして記録し、flushでまとめてDBに書き込む。
+    """
+
+    def __init__(self) -> None:
+        self._threads: Dict[int, ThreadActivity] = {}
+        self._dirty: Set[int] = set()
+        self._children: Dict[int, Set[int]] = {}  # 親チャンネルID → スレッドID
+
+    def __len__(self) -> int:
+        return len(self._threads)
+
+    def _add(self, activity: ThreadActivity) -> None:
+        self._threads[activity.thread_id] = activity
+        if activity.parent_id is not None:
+            self._children.setdefault(activity.parent_id, set()).add(activity.thread_id)
+
+    def load(self, activities: Iterable[ThreadActivity]) -> None:
+        """DBの内容を読み込む（メモリ上の方が新しい記録は残す）"""
+        for activity in activities:
+            current = self._threads.get(activity.thread_id)
+            if current is None or current.last_message_id < activity.last_message_id:
+                self._add(activity)
+
+    def record(
+        self,
+        thread_id: int,
+        guild_id: int,
+        parent_id: Optional[int],
+        message_id: int,
+        created_at: datetime,
+        is_human: bool,
+    ) -> None:
+        """メッセージを記録する（古いメッセージは無視する）"""
+        activity = self._threads.get(thread_id)
+        if activity is None:
+            activity = ThreadActivity(
+                thread_id=thread_id,
+                guild_id=guild_id,
+                parent_id=parent_id,
+                last_message_id=message_id,
+                last_message_at=created_at,
+            )
+            self._add(activity)
+        elif message_id > activity.last_message_id:
+            activity.last_message_id = message_id
+            activity.last_message_at = created_at
+
+        if is_human and (
+            activity.last_human_message_id is None
+            or message_id > activity.last_human_message_id
+        ):
+            activity.last_human_message_id = message_id
+            activity.last_human_message_at = created_at
+
+        self._dirty.add(thread_id)
+
+    def get(self, thread_id: int) -> Optional[ThreadActivity]:
+        return self._threads.get(thread_id)
+
+    def forget(self, thread_ids: Iterable[int]) -> None:
+        """DBから削除したスレッドの記録を破棄する"""
+        for thread_id in thread_ids:
+            activity = self._threads.pop(thread_id, None)
+            self._dirty.discard(thread_id)
+            if activity is not None and activity.parent_id is not None:
+                children = self._children.get(activity.parent_id)
+                if children is not None:
+                    children.discard(thread_id)
+                    if not children:
+                        del self._children[activity.parent_id]
+
+    def mark_exclusion_changed(self, channel_id: int, guild_id: int) -> None:
+        """除外設定の変更時に、影響するスレッドの次回リマインド時刻を計算し直させる
+
+        スレッドの設定ならそのスレッドのみ、チャンネルの設定なら子スレッドのみを対象にする。
+        """
+        if channel_id in self._threads:
+            self._dirty.add(channel_id)
+        self._dirty.update(self._children.get(channel_id, ()))
+
+    def take_dirty(self) -> List[ThreadActivity]:
+        """書き出し待ちの記録を取り出す"""
+        dirty = [self._threads[t] for t in self._dirty if t in self._threads]
+        self._dirty.clear()
+        return dirty
+
+    def mark_dirty(self, activities: Iterable[ThreadActivity]) -> None:
+        """書き出しに失敗した記録を書き出し待ちに戻す"""
+        self._dirty.update(activity.thread_id for activity in activities)
+
+
+# 全Cog共通の発言記録
+activity_tracker = ActivityTracker()
+# リマインド期間が変わったら次回リマインド時刻を計算し直す
+exclusion_index.add_listener(activity_tracker.mark_exclusion_changed)
+
+
+class ThreadActivityManager:
+    def __init__(self) -> None:
+        pass
+
+    @staticmethod
+    def return_dataclass(data) -> ThreadActivity:
+        db_data = data[0]
+        return ThreadActivity(
+            thread_id=db_data.thread_id,
+            guild_id=db_data.guild_id,
+            parent_id=db_data.parent_id,
+            last_message_id=db_data.last_message_id,
+            last_message_at=_as_utc(db_data.last_message_at),
+            last_human_message_id=db_data.last_human_message_id,
+            last_human_message_at=_as_utc(db_data.last_human_message_at),
+            next_reminder_at=_as_utc(db_data.next_reminder_at),
+        )
+
+    async def load_activity(self) -> int:
+        """DBの記録をactivity_trackerに読み込む関数
+
+        Returns:
+            int: 読み込んだスレッド数
+        """
+        async with AsyncSession(engine) as session:
+            async with session.begin():
+                result = await session.execute(select(ThreadActivityDB))
+                activities = [self.return_dataclass(row) for row in result.fetchall()]
+
+        activity_tracker.load(activities)
+        return len(activities)
+
+    async def flush(self) -> int:
+        """書き出し待ちの記録をまとめてDBに書き込む関数
+
+        Returns:
+            int: 書き込んだスレッド数
+        """
+        activities = activity_tracker.take_dirty()
+        if not activities:
+            return 0
+
+        # 最終発言とリマインド期間から次回リマインド時刻を計算する
+        exclusions = await ReminderExclusionManager().resolve_many(
+            (a.thread_id, a.parent_id, a.guild_id) for a in activities
+        )
+        for a in activities:
+            weeks = reminder_weeks(exclusions[a.thread_id])
+            a.next_reminder_at = (
+                a.last_message_at + timedelta(weeks=weeks) if weeks > 0 else None
+            )
+
+        statements = []
+        for start in range(0, len(activities), FLUSH_CHUNK_SIZE):
+            chunk = activities[start : start + FLUSH_CHUNK_SIZE]
+            stmt = insert(ThreadActivityDB).values(
+                [
+                    dict(
+                        thread_id=a.thread_id,
+                        guild_id=a.guild_id,
+                        parent_id=a.parent_id,
+                        last_message_id=a.last_message_id,
+                        last_message_at=a.last_message_at,
+                        last_human_message_id=a.last_human_message_id,
+                        last_human_message_at=a.last_human_message_at,
+                        next_reminder_at=a.next_reminder_at,
+                    )
+                    for a in chunk
+                ]
+            )
+            statements.append(
+                stmt.on_conflict_do_update(
+                    index_elements=["thread_id"],
+                    set_=dict(
+                        last_message_id=stmt.excluded.last_message_id,
+                        last_message_at=stmt.excluded.last_message_at,
+                        last_human_message_id=stmt.excluded.last_human_message_id,
+                        last_human_message_at=stmt.excluded.last_human_message_at,
+                        next_reminder_at=stmt.excluded.next_reminder_at,
+                    ),
+                )
+            )
+
+        try:
+            await db_writer.execute(*statements)
+        except Exception:
+            activity_tracker.mark_dirty(activities)
+            raise
+        return len(activities)
+
+    async def get_due_reminders(
+        self, now: datetime, limit: int
+    ) -> List[ThreadActivity]:
+        """次回リマインド時刻を過ぎた保守対象スレッドを取得する関数
+
+        Args:
+            now (datetime): 現在時刻（UTC）
+            limit (int): 最大件数
+
+        Returns:
+            List[ThreadActivity]: 次回リマインド時刻の古い順
+        """
+        async with AsyncSession(engine) as session:
+            async with session.begin():
+                stmt = (
+                    select(ThreadActivityDB)
+                    .join(
+                        ChannelDataDB,
+                        (ChannelDataDB.channel_id == ThreadActivityDB.thread_id)
+                        & (ChannelDataDB.guild_id == ThreadActivityDB.guild_id),
+                    )
+                    .where(ThreadActivityDB.next_reminder_at.is_not(None))
+                    .where(ThreadActivityDB.next_reminder_at <= now)
+                    .where(ChannelDataDB.keep)
+                    .order_by(ThreadActivityDB.next_reminder_at)
+                    .limit(limit)
+                )
+                result = await session.execute(stmt)
+                return [self.return_dataclass(row) for row in result.fetchall()]
+
+    async def set_next_reminder(
+        self, thread_id: int, next_reminder_at: Optional[datetime]
+    ) -> None:
+        """次回リマインド時刻を更新する関数
+
+        Args:
+            thread_id (int): スレッドのID
+            next_reminder_at (Optional[datetime]): 次回リマインド時刻（Noneでリマインドしない）
+        """
+        activity = activity_tracker.get(thread_id)
+        if activity is not None:
+            activity.next_reminder_at = next_reminder_at
+
+        stmt = (
+            update(ThreadActivityDB)
+            .where(ThreadActivityDB.thread_id == thread_id)
+            .values(next_reminder_at=next_reminder_at)
+        )
+        await db_writer.execute(stmt)
@@ -1,26 +1,40 @@
 import asyncio
 from dataclasses import dataclass
-from datetime import datetime, timedelta
-from typing import List, Optional
-
-from sqlalchemy import delete, exc, insert, select, update
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional
+
+from sqlalchemy import (
+    Index,
+    bindparam,
+    delete,
+    exc,
+    exists,
+    func,
+    insert,
+    select,
+    text,
+    update,
+)
 from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.sql import Executable
 from sqlalchemy.schema import Column
 from sqlalchemy.types import VARCHAR, BigInteger, Boolean, DateTime, Integer, String
 
 try:
-    from .db import engine
+    from .db import Base, engine
+    from .db_writer import db_writer
+    from .deadline_queue import DeadlineQueue
+    from .fast_query import DEFAULT_PAGE_SIZE, fetch_one, fetch_scalar, iter_keyset
 except ImportError:
-    from db import engine
-
-
-Base = declarative_base()
+    from db import Base, engine
+    from db_writer import db_writer
+    from deadline_queue import DeadlineQueue
+    from fast_query import DEFAULT_PAGE_SIZE, fetch_one, fetch_scalar, iter_keyset
 
 
-@dataclass
+@dataclass(slots=True)
 class ChannelData:
     channel_id: int
     guild_id: int
@@ -34,17 +48,52 @@ class ChannelDataDB(Base):
     guild_id = Column(BigInteger, primary_key=True)  # guild_id
     keep = Column(Boolean, default=True)  # keep
     archive_time = Column(DateTime, nullable=False)  # archive_time
+    unkept_at = Column(DateTime, nullable=True)  # 保守を外した時刻（UTC、保守中はNone）
+
+    __table_args__ = (
+        # get_about_to_expire_channel用（保守対象のみの部分インデックス）
+        Index(
+            "ix_channel_setting_kept_archive_time",
+            "archive_time",
+            sqlite_where=text("keep = 1"),
+        ),
+        # get_data_guild用
+        Index("ix_channel_setting_guild_id", "guild_id"),
+    )
+
+
+# よく呼ばれる読み取り用の文（引数はchannel_idとguild_id）
+_SAME_CHANNEL = (ChannelDataDB.channel_id == bindparam("channel_id")) & (
+    ChannelDataDB.guild_id == bindparam("guild_id")
+)
+CHANNEL_EXISTS = select(exists().where(_SAME_CHANNEL))
+MAINTENANCE_CHANNEL_EXISTS = select(exists().where(_SAME_CHANNEL, ChannelDataDB.keep))
+# 列の順番はChannelDataのフィールドの順に合わせる
+_CHANNEL_COLUMNS = (
+    ChannelDataDB.channel_id,
+    ChannelDataDB.guild_id,
+    ChannelDataDB.keep,
+    ChannelDataDB.archive_time,
+)
+CHANNEL_DATA = select(*_CHANNEL_COLUMNS).where(_SAME_CHANNEL)
+# 保守対象をアーカイブ期限の順に読む（ix_channel_setting_kept_archive_timeの順）
+_KEPT_BY_ARCHIVE_TIME = (
+    ChannelDataDB.archive_time,
+    ChannelDataDB.channel_id,
+    ChannelDataDB.guild_id,
+)
+
+
+# 保守対象スレッドのアーカイブ期限（期限の24時間前に延長処理を行う）
+archive_deadlines: DeadlineQueue[tuple[int, int]] = DeadlineQueue(
+    lead=timedelta(hours=24)
+)
 
 
 class ChannelDataManager:
     def __init__(self) -> None:
         pass
 
-    async def create_table(self) -> None:
-        """テーブルを作成する関数"""
-        async with engine.begin() as conn:
-            await conn.run_sync(ChannelDataDB.metadata.create_all)
-
     @staticmethod
     def return_dataclass(data: ChannelDataDB) -> ChannelData:
         db_data = data[0]
@@ -79,22 +128,34 @@ class ChannelDataManager:
             guild_id (int): サーバーのID
             archive_time (datetime): アーカイブされる時間
         """
-        async with AsyncSession(engine) as session:
-            async with session.begin():
-                stmt = insert(ChannelDataDB).values(
-                    channel_id=channel_id, guild_id=guild_id, archive_time=archive_time
-                )
+        await db_writer.execute(
+            self.build_resister_channel(channel_id, guild_id, archive_time)
+        )
 
-                do_update_stmt = stmt.on_conflict_do_update(
-                    index_elements=["channel_id", "guild_id"],
-                    set_=dict(
-                        channel_id=channel_id,
-                        guild_id=guild_id,
-                        keep=True,
-                        archive_time=archive_time,
-                    ),
-                )
-                await session.execute(do_update_stmt)
+        archive_deadlines.schedule((channel_id, guild_id), archive_time)
+
+    @staticmethod
+    def build_resister_channel(
+        channel_id: int, guild_id: int, archive_time: datetime
+    ) -> Executable:
+        """resister_channelのupsert文を作る関数（他の書き込みとまとめてコミットする場合に使う）
+
+        コミット後にarchive_deadlinesへの登録が必要
+        """
+        stmt = insert(ChannelDataDB).values(
+            channel_id=channel_id, guild_id=guild_id, archive_time=archive_time
+        )
+
+        return stmt.on_conflict_do_update(
+            index_elements=["channel_id", "guild_id"],
+            set_=dict(
+                channel_id=channel_id,
+                guild_id=guild_id,
+                keep=True,
+                archive_time=archive_time,
+                unkept_at=None,
+            ),
+        )
 
     async def is_maintenance_channel(self, channel_id: int, guild_id: int) -> bool:
         """監視対象チャンネルかどうかを判定する関数
@@ -106,21 +167,8 @@ class ChannelDataManager:
         Returns:
             bool: 監視対象チャンネルであればTrue、そうでなければFalse
         """
-        async with AsyncSession(engine) as session:
-            async with session.begin():
-                stmt = (
-                    select(ChannelDataDB)
-                    .where(ChannelDataDB.channel_id == channel_id)
-                    .where(ChannelDataDB.guild_id == guild_id)
-                    .where(ChannelDataDB.keep)
-                )
-
-                result = await session.execute(stmt)
-                result = result.fetchone()
-                if result is None:
-                    return False
-                else:
-                    return True
+        params = {"channel_id": channel_id, "guild_id": guild_id}
+        return bool(await fetch_scalar(MAINTENANCE_CHANNEL_EXISTS, params))
 
     async def is_exists(self, channel_id: int, guild_id: int) -> bool:
         """チャンネルが登録されているかどうかを判定する関数
@@ -132,20 +180,8 @@ class ChannelDataManager:
         Returns:
             bool: チャンネルが登録されていればTrue、そうでなければFalse
         """
-        async with AsyncSession(engine) as session:
-            async with session.begin():
-                stmt = (
-                    select(ChannelDataDB)
-                    .where(ChannelDataDB.channel_id == channel_id)
-                    .where(ChannelDataDB.guild_id == guild_id)
-                )
-
-                result = await session.execute(stmt)
-                result = result.fetchone()
-                if result is None:
-                    return False
-                else:
-                    return True
+        params = {"channel_id": channel_id, "guild_id": guild_id}
+        return bool(await fetch_scalar(CHANNEL_EXISTS, params))
 
     async def set_maintenance_channel(
         self, channel_id: int, guild_id: int, tf: bool
@@ -157,15 +193,27 @@ class ChannelDataManager:
             guild_id (int): サーバーのID
             tf (bool): 監視するのであればTrue、そうでなければFalse
         """
-        async with AsyncSession(engine) as session:
-            async with session.begin():
-                stmt = (
-                    update(ChannelDataDB)
-                    .where(ChannelDataDB.channel_id == channel_id)
-                    .where(ChannelDataDB.guild_id == guild_id)
-                    .values(keep=tf)
-                )
-                await session.execute(stmt)
+        if tf:
+            unkept_at = None
+        else:
+            # 既に保守を外していた場合は最初に外した時刻を残す
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            unkept_at = func.coalesce(ChannelDataDB.unkept_at, now)
+        stmt = (
+            update(ChannelDataDB)
+            .where(ChannelDataDB.channel_id == channel_id)
+            .where(ChannelDataDB.guild_id == guild_id)
+            .values(keep=tf, unkept_at=unkept_at)
+        )
+        await db_writer.execute(stmt)
+
+        if not tf:
+            archive_deadlines.unschedule((channel_id, guild_id))
+            return
+
+        channel_data = await self.get_channel_data(channel_id, guild_id)
+        if channel_data is not None:
+            archive_deadlines.schedule((channel_id, guild_id), channel_data.archive_time)
 
     async def update_archived_time(
         self, channel_id: int, guild_id: int, archive_time: datetime
@@ -177,15 +225,16 @@ class ChannelDataManager:
             guild_id (int): サーバーのID
             archive_time (datetime): アーカイブされる時間
         """
-        async with AsyncSession(engine) as session:
-            async with session.begin():
-                stmt = (
-                    update(ChannelDataDB)
-                    .where(ChannelDataDB.channel_id == channel_id)
-                    .where(ChannelDataDB.guild_id == guild_id)
-                    .values(archive_time=archive_time)
-                )
-                await session.execute(stmt)
+        stmt = (
+            update(ChannelDataDB)
+            .where(ChannelDataDB.channel_id == channel_id)
+            .where(ChannelDataDB.guild_id == guild_id)
+            .values(archive_time=archive_time)
+        )
+        await db_writer.execute(stmt)
+
+        if (channel_id, guild_id) in archive_deadlines:
+            archive_deadlines.schedule((channel_id, guild_id), archive_time)
 
     async def delete_channel(self, channel_id: int, guild_id: int) -> None:
         """チャンネルを削除する関数
@@ -194,14 +243,58 @@ class ChannelDataManager:
             channel_id (int): チャンネルのID
             guild_id (int): サーバーのID
         """
-        async with AsyncSession(engine) as session:
-            async with session.begin():
-                stmt = (
-                    delete(ChannelDataDB)
-                    .where(ChannelDataDB.channel_id == channel_id)
-                    .where(ChannelDataDB.guild_id == guild_id)
-                )
-                await session.execute(stmt)
+        stmt = (
+            delete(ChannelDataDB)
+            .where(ChannelDataDB.channel_id == channel_id)
+            .where(ChannelDataDB.guild_id == guild_id)
+        )
+        await db_writer.execute(stmt)
+
+        archive_deadlines.unschedule((channel_id, guild_id))
+
+    async def load_archive_deadlines(self) -> int:
+        """保守対象スレッドのアーカイブ期限をDBから読み込む関数
+
+        Returns:
+            int: 読み込んだスレッド数
+        """
+        # 期限の近い順に読むので、読み込み中でも先頭のページからwatch_dogが処理できる
+        archive_deadlines.clear()
+        async for channel in self.iter_maintenance_channels():
+            archive_deadlines.schedule(
+                (channel.channel_id, channel.guild_id), channel.archive_time
+            )
+
+        return len(archive_deadlines)
+
+    def iter_maintenance_channels(
+        self, page_size: int = DEFAULT_PAGE_SIZE
+    ) -> AsyncIterator[ChannelData]:
+        """保守対象チャンネルをアーカイブ期限の近い順に少しずつ読む関数
+
+        Args:
+            page_size (int, optional): 1回に読む件数
+
+        Returns:
+            AsyncIterator[ChannelData]: 保守対象チャンネル
+        """
+        stmt = select(*_CHANNEL_COLUMNS).where(ChannelDataDB.keep)
+        return iter_keyset(stmt, _KEPT_BY_ARCHIVE_TIME, ChannelData, page_size)
+
+    def iter_data_guild(
+        self, guild_id: int, page_size: int = DEFAULT_PAGE_SIZE
+    ) -> AsyncIterator[ChannelData]:
+        """get_data_guildを全件読まずにチャンネルIDの順に返す関数
+
+        Args:
+            guild_id (int): サーバーのID
+            page_size (int, optional): 1回に読む件数
+
+        Returns:
+            AsyncIterator[ChannelData]: チャンネル情報
+        """
+        stmt = select(*_CHANNEL_COLUMNS).where(ChannelDataDB.guild_id == guild_id)
+        return iter_keyset(stmt, (ChannelDataDB.channel_id,), ChannelData, page_size)
 
     async def get_about_to_expire_channel(
         self, deltas: int = 24
@@ -254,20 +347,8 @@ class ChannelDataManager:
     async def get_channel_data(
         self, channel_id: int, guild_id: int
     ) -> Optional[ChannelData]:
-        async with AsyncSession(engine) as session:
-            async with session.begin():
-                stmt = (
-                    select(ChannelDataDB)
-                    .where(ChannelDataDB.channel_id == channel_id)
-                    .where(ChannelDataDB.guild_id == guild_id)
-                )
-                result = await session.execute(stmt)
-                result = result.fetchone()
-                result = self.return_dataclass(result)
-                if result is None:
-                    return None
-                else:
-                    return result
+        params = {"channel_id": channel_id, "guild_id": guild_id}
+        return await fetch_one(CHANNEL_DATA, params, ChannelData)
 
 
 if __name__ == "__main__":
@@ -11,8 +11,10 @@ import discord
 from discord.ext import commands
 
 from .common import CommonUtil
+from .edit_coalescer import thread_edits
 from .guild_setting import GuildSettingManager
 from .notify_role import NotifySettingManager
+from .rate_limiter import Lane, rate_limiter
 from .scheduled_closures import ScheduledClosureManager
 from .thread_channels import ChannelDataManager
 from .thread_config import AutoArchiveDuration, ThreadKeeperConfig
@@ -258,36 +260,31 @@ class ThreadCommands:
 
         await interaction.response.defer()
 
-        # DBから管理対象チャンネルを取得
-        maintenance_data = await self.channel_data_manager.get_data_guild(
+        # DBから管理対象チャンネルを少しずつ読み、2000文字に達するごとに送信する
+        message = "**管理対象スレッドのアーカイブ時刻:**"
+        found = False
+        async for channel_data in self.channel_data_manager.iter_data_guild(
             interaction.guild.id
-        )
-
-        if not maintenance_data:
-            await interaction.followup.send("管理対象のスレッドはありません")
-            return
-
-        # 応答メッセージの構築
-        message_parts = ["**管理対象スレッドのアーカイブ時刻:**"]
-
-        for channel_data in maintenance_data:
+        ):
+            found = True
             channel = interaction.guild.get_channel(channel_data.channel_id)
             if channel and isinstance(channel, discord.Thread):
                 archive_time = channel_data.archive_time or "不明"
-                message_parts.append(f"• {channel.name}: {archive_time}")
+                line = f"• {channel.name}: {archive_time}"
             else:
-                message_parts.append(
-                    f"• ID {channel_data.channel_id}: チャンネルが見つかりません"
-                )
+                line = f"• ID {channel_data.channel_id}: チャンネルが見つかりません"
 
-        message = "\n".join(message_parts)
+            if len(message) + 1 + len(line) > 2000:
+                await interaction.followup.send(message)
+                message = line
+            else:
+                message = f"{message}\n{line}"
 
-        # メッセージが長すぎる場合は分割
-        if len(message) > 2000:
-            await interaction.followup.send(message[:2000])
-            await interaction.followup.send(message[2000:])
-        else:
-            await interaction.followup.send(message)
+        if not found:
+            await interaction.followup.send("管理対象のスレッドはありません")
+            return
+
+        await interaction.followup.send(message)
 
     async def add_staff_command(self, interaction: discord.Interaction):
         """現在のスレッドにスタッフを参加させるコマンドの実装"""
@@ -320,7 +317,8 @@ class ThreadCommands:
 
                 # 元メッセージを編集してメンションを消す
                 try:
-                    await message.edit(content=content_wo_mentions)
+                    async with rate_limiter.slot("message_edit", thread.guild.id):
+                        await message.edit(content=content_wo_mentions)
                 except Exception as e:
                     self.logger.error(f"メッセージ編集失敗: {e}")
 
@@ -342,7 +340,8 @@ class ThreadCommands:
                 if role_mentions:
                     # roleのメンションにcontent_wo_mentionsを足して送る
                     content = f"{' '.join(role_mentions)} {content_wo_mentions}"
-                    await message.edit(content=content)
+                    async with rate_limiter.slot("message_edit", thread.guild.id):
+                        await message.edit(content=content)
                 break
 
     async def _execute_thread_close(self, thread: discord.Thread) -> bool:
@@ -355,7 +354,7 @@ class ThreadCommands:
             new_name = f"{self.config.CLOSED_THREAD_PREFIX}{truncated_name}"
 
         try:
-            await thread.edit(name=new_name, archived=True)
+            await thread_edits.edit(thread, name=new_name, archived=True)
 
             await self.channel_data_manager.set_maintenance_channel(
                 channel_id=thread.id,
@@ -383,7 +382,10 @@ class ThreadCommands:
         # 閉架予約があればキャンセル
         await self.scheduled_closure_manager.cancel_closure(thread_id=thread.id)
 
-        await interaction.response.send_message("スレッドを閉架します...")
+        async with rate_limiter.slot(
+            "interaction_response", thread.guild.id, lane=Lane.INTERACTION
+        ):
+            await interaction.response.send_message("スレッドを閉架します...")
         await asyncio.sleep(1)
         await self._execute_thread_close(thread)
 
@@ -413,9 +415,12 @@ class ThreadCommands:
         )
 
         ts = self._to_discord_timestamp(scheduled_close_time)
-        await interaction.response.send_message(
-            f"このスレッドは{duration_display}後（{ts}）に閉架予定です"
-        )
+        async with rate_limiter.slot(
+            "interaction_response", interaction.guild.id, lane=Lane.INTERACTION
+        ):
+            await interaction.response.send_message(
+                f"このスレッドは{duration_display}後（{ts}）に閉架予定です"
+            )
 
     async def cancel_close_command(self, interaction: discord.Interaction):
         """閉架予約をキャンセルするコマンドの実装"""
@@ -639,13 +644,15 @@ class ThreadCommands:
 
         success = 0
         failed = 0
-        for thread in targets:
-            try:
-                await thread.edit(archived=True)
-                success += 1
-            except Exception as e:
-                self.logger.error(f"Failed to archive thread {thread.id}: {e}")
-                failed += 1
+        with rate_limiter.lane(Lane.BACKGROUND):
+            for thread in targets:
+                try:
+                    async with rate_limiter.slot("thread_edit", thread.guild.id):
+                        await thread.edit(archived=True)
+                    success += 1
+                except Exception as e:
+                    self.logger.error(f"Failed to archive thread {thread.id}: {e}")
+                    failed += 1
 
         result_parts = [f"{success}件をアーカイブしました"]
         if failed:
@@ -45,7 +45,21 @@ class ThreadKeeperConfig:
     REMINDER_TARGET_GUILD_IDS = [410454762522411009]
 
     # タスク設定
-    WATCH_DOG_INTERVAL_MINUTES = 15  # watch_dogタスクの実行間隔（分）
-    SCHEDULED_CLOSURE_CHECK_INTERVAL_MINUTES = 1  # 閉架予約チェックの実行間隔（分）
-    THREAD_PROCESSING_SLEEP_SECONDS = 5  # スレッド処理間の待機時間（秒）
-    ARCHIVE_EXTENSION_SLEEP_SECONDS = 10  # アーカイブ延長処理の待機時間（秒）
+    WATCH_DOG_INTERVAL_MINUTES = (
+        15  # アーカイブ延長が反映されなかった場合の再試行間隔（分）
+    )
+    SCHEDULED_CLOSURE_RETRY_MINUTES = 1  # 閉架予約の失敗時の再試行間隔（分）
+    ARCHIVE_EXTENSION_CONFIRM_TIMEOUT_SECONDS = 10  # 一時変更の反映を待つ上限（秒）
+    ARCHIVE_EXTENSION_CONCURRENCY = 8  # 同時に延長処理を行うスレッド数の上限
+    ACTIVITY_FLUSH_INTERVAL_SECONDS = 30  # 最終発言の記録をDBに書き込む間隔（秒）
+    REMINDER_CHECK_INTERVAL_MINUTES = 10  # 期限を迎えたリマインドを確認する間隔（分）
+    REMINDER_BATCH_SIZE = 100  # 1回の確認で送信するリマインドの上限
+    THREAD_CREATION_CONCURRENCY = 4  # 同時に作成時の処理を行うスレッド数の上限
+    THREAD_CREATION_SHED_DEPTH = 20  # 待ち行列がこれを超えたら省略可能な処理を省く
+
+    # 保持期間設定
+    RETENTION_INTERVAL_HOURS = 24  # 不要な行を削除する間隔（時間）
+    RETENTION_UNKEPT_CHANNEL_DAYS = 30  # 保守を外したスレッドの行を残す日数
+    RETENTION_GONE_THREAD_DAYS = 90  # 削除されたスレッドの除外設定・保守対象外の発言記録を最後の発言から残す日数
+    RETENTION_BATCH_SIZE = 500  # 1回のDELETEで削除する行数の上限
+    RETENTION_VACUUM_MAX_PAGES = 1000  # 1回のincremental vacuumで解放するページ数の上限
@@ -5,11 +5,15 @@
 import asyncio
 import logging
 from datetime import datetime, timedelta
+from typing import Optional
 
 import discord
 
 from .thread_config import ThreadKeeperConfig
+from .edit_coalescer import thread_edits
 from .notify_role import NotifySettingManager
+from .rate_limiter import rate_limiter
+from .thread_activity import ThreadActivityManager, activity_tracker, reminder_weeks
 from .thread_channels import ChannelDataManager
 from .reminder_exclusions import ReminderExclusionManager
 
@@ -26,9 +30,20 @@ class ThreadManager:
         self.channel_data_manager = ChannelDataManager()
         self.notify_role = NotifySettingManager()
         self.reminder_exclusions = ReminderExclusionManager()
+        self.thread_activity_manager = ThreadActivityManager()
 
-    async def _should_exclude_from_reminder(self, thread: discord.Thread) -> bool:
-        """2週間リマインドから除外すべきかどうかを確認"""
+        # 最近の発言でアーカイブ期限が延びていたため延長を省略した回数
+        self.skipped_extensions = 0
+        self.avoided_api_calls = 0
+
+    async def _should_exclude_from_reminder(
+        self, thread: discord.Thread, excluded: Optional[bool] = None
+    ) -> bool:
+        """2週間リマインドから除外すべきかどうかを確認
+
+        Args:
+            excluded: 解決済みの除外状態（リマインド期間0など。Noneなら個別に確認）
+        """
         guild_id = thread.guild.id
 
         # フォーラムチャンネルは除外
@@ -43,8 +58,12 @@ class ThreadManager:
             return True
 
         # DBから除外設定をチェック
-        parent_id = thread.parent.id if thread.parent else None
-        if await self.reminder_exclusions.is_excluded(thread.id, guild_id, parent_id):
+        if excluded is None:
+            parent_id = thread.parent.id if thread.parent else None
+            excluded = await self.reminder_exclusions.is_excluded(
+                thread.id, guild_id, parent_id
+            )
+        if excluded:
             return True
 
         return False
@@ -74,23 +93,42 @@ class ThreadManager:
         """スレッドのアーカイブ時間を延長する
 
         一時的に短い時間を設定してから1週間に戻すことで、
-        サイレントにアーカイブ時間を延長する
+        サイレントにアーカイブ時間を延長する。
+        1回目の変更がon_thread_updateで届いた時点で2回目の変更を行う
         """
+        # 変更の通知を取りこぼさないよう、editより先に待ち受けを登録する
+        confirmed = asyncio.ensure_future(
+            self.bot.wait_for(
+                "thread_update",
+                check=lambda before, after: (
+                    after.id == thread.id
+                    and after.auto_archive_duration == self.config.TMP_ARCHIVE_DURATION
+                ),
+                timeout=self.config.ARCHIVE_EXTENSION_CONFIRM_TIMEOUT_SECONDS,
+            )
+        )
         try:
-            # type: ignore を使用して型エラーを回避
-            await thread.edit(auto_archive_duration=self.config.TMP_ARCHIVE_DURATION)  # type: ignore
+            async with rate_limiter.slot("thread_edit", thread.guild.id):
+                # type: ignore を使用して型エラーを回避
+                await thread.edit(auto_archive_duration=self.config.TMP_ARCHIVE_DURATION)  # type: ignore
         except (discord.Forbidden, discord.HTTPException, Exception):
+            confirmed.cancel()
             await self._handle_maintenance_error(thread, "extend_archive_duration")
             return
 
-        await asyncio.sleep(self.config.ARCHIVE_EXTENSION_SLEEP_SECONDS)
+        try:
+            _, thread = await confirmed
+        except asyncio.TimeoutError:
+            # 通知が届かなくてもタイムアウト後に2回目の変更を行う
+            self.logger.debug(f"thread_update for {thread.id} timed out")
 
         if thread.archived:
             return
 
         try:
-            # type: ignore を使用して型エラーを回避
-            await thread.edit(auto_archive_duration=self.config.FINAL_ARCHIVE_DURATION)  # type: ignore
+            async with rate_limiter.slot("thread_edit", thread.guild.id):
+                # type: ignore を使用して型エラーを回避
+                await thread.edit(auto_archive_duration=self.config.FINAL_ARCHIVE_DURATION)  # type: ignore
         except (discord.Forbidden, discord.HTTPException, Exception):
             await self._handle_maintenance_error(thread, "extend_archive_duration")
 
@@ -111,9 +149,10 @@ class ThreadManager:
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                msg = await thread.send(content)
-                await asyncio.sleep(1)
-                await msg.edit(content=f"{role_mentions} {content}")
+                async with rate_limiter.slot("message_send", thread.guild.id):
+                    msg = await thread.send(content)
+                async with rate_limiter.slot("message_edit", thread.guild.id):
+                    await msg.edit(content=f"{role_mentions} {content}")
                 return
             except discord.Forbidden:
                 if attempt < max_retries - 1:
@@ -134,14 +173,39 @@ class ThreadManager:
             minutes=thread.auto_archive_duration
         )
 
+    def return_actual_archive_time(self, thread: discord.Thread) -> datetime:
+        """最新の発言も考慮したアーカイブ時間を計算
+
+        発言があるとアーカイブまでの時間はリセットされるため、
+        archive_timestamp・last_message_id・on_messageの記録のうち最も新しい時刻を起点にする
+        """
+        last_activity = thread.archive_timestamp
+        if thread.last_message_id:
+            last_activity = max(
+                last_activity, discord.utils.snowflake_time(thread.last_message_id)
+            )
+        activity = activity_tracker.get(thread.id)
+        if activity is not None:
+            last_activity = max(last_activity, activity.last_message_at)
+        return last_activity + timedelta(minutes=thread.auto_archive_duration)
+
+    def record_skipped_extension(self) -> None:
+        """延長を省略したことを記録する（一時設定と戻しの2回のeditを省略）"""
+        self.skipped_extensions += 1
+        self.avoided_api_calls += 2
+
     async def get_last_human_message_time(
         self, thread: discord.Thread
     ) -> datetime | None:
         """スレッドの最後の人間のメッセージ時刻を取得
 
-        まずlast_messageを確認し、それが人間のメッセージでなければ
-        履歴を検索する（効率化のため）
+        on_messageで記録した発言があればそれを使い、なければlast_messageを確認し、
+        それが人間のメッセージでなければ履歴を検索する（効率化のため）
         """
+        activity = activity_tracker.get(thread.id)
+        if activity is not None and activity.last_human_message_at is not None:
+            return activity.last_human_message_at
+
         try:
             # まずlast_messageをチェック
             if thread.last_message is not None and not thread.last_message.author.bot:
@@ -161,17 +225,31 @@ class ThreadManager:
 
         return None
 
-    async def send_inactivity_reminder(self, thread: discord.Thread):
-        """非アクティブスレッドにリマインダーを送信"""
+    async def send_inactivity_reminder(
+        self,
+        thread: discord.Thread,
+        reminder_weeks: Optional[int] = None,
+        roles: Optional[list[int]] = None,
+    ) -> Optional[discord.Message]:
+        """非アクティブスレッドにリマインダーを送信
+
+        Args:
+            reminder_weeks: 解決済みのリマインダー期間（Noneならスレッドの設定を取得）
+            roles: 解決済みのメンション対象
+        """
         try:
             # スレッドのリマインダー期間・rolesを取得
-            exclusion = await self.reminder_exclusions.get_exclusion(
-                thread.id, thread.guild.id
-            )
-            reminder_weeks = (
-                exclusion.reminder_weeks if exclusion else self.config.REMINDER_WEEKS
-            )
-            roles = exclusion.roles if exclusion and exclusion.roles else []
+            if reminder_weeks is None:
+                exclusion = await self.reminder_exclusions.get_exclusion(
+                    thread.id, thread.guild.id
+                )
+                reminder_weeks = (
+                    exclusion.reminder_weeks
+                    if exclusion
+                    else self.config.REMINDER_WEEKS
+                )
+                roles = exclusion.roles if exclusion else None
+            roles = roles or []
 
             # DBのrolesがあればそれをメンション、なければスレッドオーナー
             mentions = []
@@ -196,10 +274,12 @@ class ThreadManager:
                 "まだ活動中の場合は何か書き込みをお願いします。"
             )
 
-            await thread.send("\n".join(message_parts))
+            async with rate_limiter.slot("message_send", thread.guild.id):
+                message = await thread.send("\n".join(message_parts))
             self.logger.info(
                 f"Sent inactivity reminder to thread {thread.name} in {thread.guild.name}"
             )
+            return message
 
         except discord.Forbidden:
             self.logger.error(
@@ -207,6 +287,7 @@ class ThreadManager:
             )
         except Exception as e:
             self.logger.error(f"Error sending reminder to thread {thread.id}: {e}")
+        return None
 
     async def process_closed_thread_reopening(self, message: discord.Message):
         """CLOSEDプレフィックス付きスレッドの再開処理"""
@@ -215,9 +296,11 @@ class ThreadManager:
             return
 
         try:
-            await thread.edit(archived=False)
-            await thread.edit(
-                name=thread.name.replace(self.config.CLOSED_THREAD_PREFIX, "")
+            # アーカイブ解除と名前変更を1回のeditで行う
+            await thread_edits.edit(
+                thread,
+                archived=False,
+                name=thread.name.replace(self.config.CLOSED_THREAD_PREFIX, ""),
             )
 
             # DBに保守対象として登録
@@ -262,53 +345,98 @@ class ThreadManager:
                 else:
                     continue
 
-                msg = await thread.send(content)
-                await asyncio.sleep(1)
-
-                await msg.edit(content=f"{role_mentions} {content}")
-                await asyncio.sleep(1)
+                async with rate_limiter.slot("message_send", guild.id):
+                    msg = await thread.send(content)
+                async with rate_limiter.slot("message_edit", guild.id):
+                    await msg.edit(content=f"{role_mentions} {content}")
 
             except discord.Forbidden:
                 self.logger.error(f"Cannot add staff to thread {thread.id}")
             except Exception as e:
                 self.logger.error(f"Error adding staff to thread {thread.id}: {e}")
 
-    async def check_inactivity_and_remind(self, thread: discord.Thread) -> bool:
-        """スレッドの非アクティブ状態をチェックしてリマインドを送信
+    def seed_activity(self, thread: discord.Thread) -> None:
+        """on_messageで未記録のスレッドをキャッシュ済みの情報から記録する（APIは呼ばない）"""
+        if activity_tracker.get(thread.id) is not None:
+            return
+
+        if thread.last_message_id:
+            message_id = thread.last_message_id
+            created_at = discord.utils.snowflake_time(message_id)
+        else:
+            message_id = thread.id
+            created_at = thread.created_at or discord.utils.snowflake_time(thread.id)
+        activity_tracker.record(
+            thread_id=thread.id,
+            guild_id=thread.guild.id,
+            parent_id=thread.parent_id,
+            message_id=message_id,
+            created_at=created_at,
+            is_human=False,
+        )
+
+    async def dispatch_due_reminders(self) -> int:
+        """次回リマインド時刻を過ぎたスレッドにリマインドを送信
 
         Returns:
-            bool: リマインドを送信した場合はTrue
+            int: リマインドを送信したスレッド数
         """
-        # 除外チェック
-        if await self._should_exclude_from_reminder(thread):
-            return False
-
-        # 指定週間前の時刻を計算
-        weeks_ago = discord.utils.utcnow() - timedelta(weeks=self.config.REMINDER_WEEKS)
+        now = discord.utils.utcnow()
+        due = await self.thread_activity_manager.get_due_reminders(
+            now, self.config.REMINDER_BATCH_SIZE
+        )
+        if not due:
+            return 0
 
-        last_message_time = None
+        exclusions = await self.reminder_exclusions.resolve_many(
+            (a.thread_id, a.parent_id, a.guild_id) for a in due
+        )
 
-        # まずthread.last_messageを確認
-        if isinstance(thread.last_message, discord.Message):
-            last_message_time = thread.last_message.created_at
-        elif thread.last_message_id:
-            # thread.last_messageが使えない場合はfetch_messageを使用
-            try:
-                last_message = await thread.fetch_message(thread.last_message_id)
-                last_message_time = last_message.created_at
-            except (discord.NotFound, discord.Forbidden, discord.HTTPException) as e:
-                self.logger.error(
-                    f"Cannot fetch last message {thread.last_message_id} from thread {thread.id}: {e}"
+        sent = 0
+        for activity in due:
+            exclusion = exclusions[activity.thread_id]
+            weeks = reminder_weeks(exclusion)
+
+            guild = self.bot.get_guild(activity.guild_id)
+            thread = guild.get_thread(activity.thread_id) if guild else None
+            if thread is None or await self._should_exclude_from_reminder(
+                thread, weeks == 0
+            ):
+                await self.thread_activity_manager.set_next_reminder(
+                    activity.thread_id, None
                 )
-                # メッセージ取得に失敗した場合はthread.created_atを使用
-                last_message_time = thread.created_at
-        else:
-            # last_messageもlast_message_idもない場合はthread.created_atを使用
-            last_message_time = thread.created_at
+                continue
+
+            # まだ書き出していない発言があればそちらを使う
+            last_message_at = activity.last_message_at
+            tracked = activity_tracker.get(activity.thread_id)
+            if tracked is not None and tracked.last_message_at > last_message_at:
+                last_message_at = tracked.last_message_at
+
+            # 最後の発言が新しい、または記録後にリマインド期間が延びていた場合は送らずに再設定する
+            due_at = last_message_at + timedelta(weeks=weeks)
+            if due_at > now:
+                await self.thread_activity_manager.set_next_reminder(
+                    activity.thread_id, due_at
+                )
+                continue
 
-        # 指定週間以上経過している場合
-        if last_message_time and last_message_time < weeks_ago:
-            await self.send_inactivity_reminder(thread)
-            return True
+            message = await self.send_inactivity_reminder(
+                thread, weeks, exclusion.roles if exclusion else None
+            )
+            if message is not None:
+                # 送信したリマインドを最終発言として記録（on_messageより先に書き出されても再送しない）
+                activity_tracker.record(
+                    thread_id=thread.id,
+                    guild_id=thread.guild.id,
+                    parent_id=thread.parent_id,
+                    message_id=message.id,
+                    created_at=message.created_at,
+                    is_human=False,
+                )
+                sent += 1
+            await self.thread_activity_manager.set_next_reminder(
+                activity.thread_id, now + timedelta(weeks=weeks)
+            )
 
-        return False
+        return sent
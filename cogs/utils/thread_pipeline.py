@@ -0,0 +1,288 @@
+"""
+スレッド作成時の処理をまとめて実行するパイプライン
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Optional, Tuple
+
+import discord
+from sqlalchemy.sql import Executable
+
+try:
+    from .db_writer import db_writer
+    from .thread_config import ThreadKeeperConfig
+except ImportError:
+    from db_writer import db_writer
+    from thread_config import ThreadKeeperConfig
+
+
+@dataclass
+class CreationContext:
+    """1スレッド分のパイプライン実行中に共有する情報"""
+
+    thread: discord.Thread
+    statements: List[Executable] = field(default_factory=list)
+    after_commit: List[Callable[[], None]] = field(default_factory=list)
+    results: Dict[str, Any] = field(default_factory=dict)  # ステージ名ごとの戻り値
+
+    def write(
+        self, statement: Executable, after_commit: Optional[Callable[[], None]] = None
+    ) -> None:
+        """パイプライン終了時に1トランザクションでコミットする文を登録する
+
+        Args:
+            after_commit: コミット後に呼ぶ関数（メモリ上のキューやインデックスの更新など）
+        """
+        self.statements.append(statement)
+        if after_commit is not None:
+            self.after_commit.append(after_commit)
+
+
+StageFunc = Callable[[CreationContext], Awaitable[Any]]
+
+# 混雑時の扱い（drop: 実行しない、defer: 混雑が解消してから実行する）
+ShedPolicy = Literal["drop", "defer"]
+
+
+@dataclass
+class Stage:
+    name: str
+    func: StageFunc
+    after: Tuple[str, ...] = ()  # 先に終わっている必要があるステージ
+    shed: Optional[ShedPolicy] = None  # Noneなら混雑時も必ず実行する
+
+
+@dataclass
+class AdmissionStats:
+    waiting: int  # 実行待ちのスレッド数
+    in_flight: int  # 実行中のスレッド数
+    admitted: int  # 実行したスレッド数
+    shed: Dict[str, int]  # ステージごとの省略回数
+    deferred: Dict[str, int]  # ステージごとの後回し回数
+
+
+@dataclass
+class StageStats:
+    name: str
+    runs: int = 0
+    failures: int = 0
+    skipped: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+
+    @property
+    def average_ms(self) -> float:
+        return self.total_ms / self.runs if self.runs else 0.0
+
+
+class ThreadCreationPipeline:
+    """各Cogが登録したステージを依存関係に従って実行するクラス
+
+    依存のないステージは並行に実行し、失敗したステージに依存するステージは実行しない。
+    登録されていないステージへの依存は無視する（Cogが読み込まれていない場合など）。
+    ステージがctx.writeで登録した文は、全ステージの終了後に1回でコミットする。
+
+    同時に処理するスレッドは `concurrency` 件までで、残りは順番を待つ。
+    待機中と実行中の合計が `shed_depth` を超えている間は、
+    shedを指定したステージを省略（drop）または混雑解消後に実行（defer）する。
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        shed_depth: int,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.concurrency = concurrency
+        self.shed_depth = shed_depth
+        self.logger = logger or logging.getLogger("discord")
+        self._stages: Dict[str, Stage] = {}
+        self._stats: Dict[str, StageStats] = {}
+
+        self._admission: Optional[asyncio.Semaphore] = None
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._waiting = 0
+        self._in_flight = 0
+        self._admitted = 0
+        self._shed: Counter[str] = Counter()
+        self._deferred: Counter[str] = Counter()
+        self._deferred_tasks: set[asyncio.Task] = set()
+
+    @property
+    def depth(self) -> int:
+        return self._waiting + self._in_flight
+
+    def register(
+        self,
+        name: str,
+        func: StageFunc,
+        after: Tuple[str, ...] = (),
+        shed: Optional[ShedPolicy] = None,
+    ) -> None:
+        """ステージを登録する（同名のステージは置き換える）"""
+        self._stages[name] = Stage(name=name, func=func, after=tuple(after), shed=shed)
+        self._stats.setdefault(name, StageStats(name=name))
+
+    def unregister(self, *names: str) -> None:
+        for name in names:
+            self._stages.pop(name, None)
+
+    async def _run_stage(self, stage: Stage, ctx: CreationContext) -> None:
+        stats = self._stats[stage.name]
+        started = time.perf_counter()
+        try:
+            ctx.results[stage.name] = await stage.func(ctx)
+        except Exception:
+            stats.failures += 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            stats.runs += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+
+    async def run(self, thread: discord.Thread) -> CreationContext:
+        """順番を待ってからパイプラインを実行する"""
+        if self._admission is None:
+            self._admission = asyncio.Semaphore(self.concurrency)
+
+        self._waiting += 1
+        self._idle.clear()
+        admitted = False
+        try:
+            async with self._admission:
+                self._waiting -= 1
+                admitted = True
+                self._in_flight += 1
+                self._admitted += 1
+                try:
+                    return await self._execute(thread)
+                finally:
+                    self._in_flight -= 1
+        finally:
+            if not admitted:
+                self._waiting -= 1
+            if self.depth == 0:
+                self._idle.set()
+
+    def _defer(self, stage: Stage, thread: discord.Thread) -> None:
+        """混雑が解消してからステージを単独で実行する"""
+
+        async def run_later() -> None:
+            await self._idle.wait()
+            ctx = CreationContext(thread=thread)
+            try:
+                await self._run_stage(stage, ctx)
+                if ctx.statements:
+                    await db_writer.execute(*ctx.statements)
+                for hook in ctx.after_commit:
+                    hook()
+            except Exception as e:
+                self.logger.error(
+                    f"thread_create: deferred stage {stage.name} failed "
+                    f"for {thread.id}: {e}"
+                )
+
+        task = asyncio.create_task(run_later(), name=f"thread_create:{stage.name}")
+        self._deferred_tasks.add(task)
+        task.add_done_callback(self._deferred_tasks.discard)
+
+    async def _execute(self, thread: discord.Thread) -> CreationContext:
+        """登録済みのステージを実行し、DBへの書き込みをまとめてコミットする"""
+        ctx = CreationContext(thread=thread)
+        stages = dict(self._stages)
+        shedding = self.depth > self.shed_depth
+        tasks: Dict[str, asyncio.Task] = {}
+        done: set[str] = set()
+        failed: set[str] = set()
+
+        def deps(stage: Stage) -> List[str]:
+            return [name for name in stage.after if name in stages]
+
+        while len(done) + len(failed) < len(stages):
+            # 依存するステージが終わったものを開始する
+            for stage in stages.values():
+                if stage.name in tasks or stage.name in done or stage.name in failed:
+                    continue
+                if any(name in failed for name in deps(stage)):
+                    failed.add(stage.name)
+                    self._stats[stage.name].skipped += 1
+                    continue
+                if not all(name in done for name in deps(stage)):
+                    continue
+                if shedding and stage.shed is not None:
+                    # 混雑中は省略または後回しにし、依存するステージは続行する
+                    if stage.shed == "defer":
+                        self._deferred[stage.name] += 1
+                        self._defer(stage, thread)
+                    else:
+                        self._shed[stage.name] += 1
+                    done.add(stage.name)
+                else:
+                    tasks[stage.name] = asyncio.create_task(
+                        self._run_stage(stage, ctx), name=f"thread_create:{stage.name}"
+                    )
+
+            running = [
+                task for name, task in tasks.items() if name not in done | failed
+            ]
+            if not running:
+                # 依存関係が循環している場合
+                for name in stages.keys() - done - failed:
+                    self.logger.error(
+                        f"thread_create: stage {name} has unmet dependencies"
+                    )
+                    failed.add(name)
+                break
+
+            finished, _ = await asyncio.wait(
+                running, return_when=asyncio.FIRST_COMPLETED
+            )
+            for name, task in tasks.items():
+                if task not in finished:
+                    continue
+                if task.exception() is not None:
+                    failed.add(name)
+                    self.logger.error(
+                        f"thread_create: stage {name} failed for {thread.id}: "
+                        f"{task.exception()}"
+                    )
+                else:
+                    done.add(name)
+
+        if ctx.statements:
+            try:
+                await db_writer.execute(*ctx.statements)
+            except Exception as e:
+                self.logger.error(f"thread_create: commit failed for {thread.id}: {e}")
+                return ctx
+            for hook in ctx.after_commit:
+                hook()
+
+        return ctx
+
+    def stats(self) -> List[StageStats]:
+        """ステージごとの実行回数と所要時間を取得する"""
+        return [self._stats[name] for name in self._stages]
+
+    def admission_stats(self) -> AdmissionStats:
+        """待ち行列の長さと省略・後回しの回数を取得する"""
+        return AdmissionStats(
+            waiting=self._waiting,
+            in_flight=self._in_flight,
+            admitted=self._admitted,
+            shed=dict(self._shed),
+            deferred=dict(self._deferred),
+        )
+
+
+# 全Cog共通のスレッド作成パイプライン
+thread_creation = ThreadCreationPipeline(
+    concurrency=ThreadKeeperConfig.THREAD_CREATION_CONCURRENCY,
+    shed_depth=ThreadKeeperConfig.THREAD_CREATION_SHED_DEPTH,
+)
@@ -0,0 +1,119 @@
+"""
+同時実行数を制限した非同期ワーカープール
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, List, Optional, Tuple
+
+Job = Tuple[Callable[..., Awaitable[Any]], Tuple[Any, ...]]
+
+
+@dataclass
+class WorkerPoolStats:
+    name: str
+    concurrency: int
+    pending: int
+    in_flight: int
+    completed: int
+    failed: int
+    throughput_per_minute: float
+
+
+class WorkerPool:
+    """投入されたジョブを最大 `concurrency` 件まで並行実行するプール
+
+    ワーカーは最初の投入時に起動する。ジョブ内の例外はログに記録し、
+    他のジョブには影響させない。
+    """
+
+    THROUGHPUT_WINDOW_SECONDS = 60.0
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: int,
+        logger: logging.Logger,
+        max_pending: int = 0,
+    ) -> None:
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+
+        self.name = name
+        self.concurrency = concurrency
+        self.logger = logger
+        self.max_pending = max_pending
+
+        self._queue: Optional[asyncio.Queue[Job]] = None
+        self._workers: List[asyncio.Task] = []
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._finished_at: Deque[float] = deque()
+
+    def _ensure_started(self) -> asyncio.Queue[Job]:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+
+        self._workers = [task for task in self._workers if not task.done()]
+        for i in range(len(self._workers), self.concurrency):
+            self._workers.append(
+                asyncio.create_task(self._worker(), name=f"{self.name}-worker-{i}")
+            )
+        return self._queue
+
+    async def submit(self, func: Callable[..., Awaitable[Any]], *args: Any) -> None:
+        """ジョブを投入する（待ち行列が満杯の場合は空くまで待機）"""
+        queue = self._ensure_started()
+        await queue.put((func, args))
+
+    async def join(self) -> None:
+        """投入済みのジョブがすべて終わるまで待機する"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self) -> None:
+        """ワーカーを停止する（未実行のジョブは破棄）"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        self._queue = None
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        while True:
+            func, args = await queue.get()
+            self._in_flight += 1
+            try:
+                await func(*args)
+                self._completed += 1
+            except Exception:
+                self._failed += 1
+                self.logger.exception(f"{self.name}: job {func.__name__} failed")
+            finally:
+                self._in_flight -= 1
+                self._finished_at.append(time.monotonic())
+                queue.task_done()
+
+    def stats(self) -> WorkerPoolStats:
+        """現在の状態と直近1分間のスループットを取得する"""
+        window_start = time.monotonic() - self.THROUGHPUT_WINDOW_SECONDS
+        while self._finished_at and self._finished_at[0] < window_start:
+            self._finished_at.popleft()
+
+        return WorkerPoolStats(
+            name=self.name,
+            concurrency=self.concurrency,
+            pending=self._queue.qsize() if self._queue is not None else 0,
+            in_flight=self._in_flight,
+            completed=self._completed,
+            failed=self._failed,
+            throughput_per_minute=len(self._finished_at)
+            * 60.0
+            / self.THROUGHPUT_WINDOW_SECONDS,
+        )
@@ -0,0 +1,82 @@
+"""
+検索用のインデックスがよく使うクエリで使われているかをEXPLAIN QUERY PLANで確認する
+"""
+
+import pathlib
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from cogs.utils.migrations import migrate
+from cogs.utils.reminder_exclusions import ReminderExclusionDB
+from cogs.utils.scheduled_closures import ScheduledClosureDB
+from cogs.utils.thread_activity import ThreadActivityDB
+from cogs.utils.thread_channels import ChannelDataDB
+
+
+class IndexUsageTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        path = pathlib.Path(self._tmp.name) / "indexes.sqlite3"
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        await migrate(self.engine)
+
+    async def asyncTearDown(self) -> None:
+        await self.engine.dispose()
+        self._tmp.cleanup()
+
+    async def plan(self, stmt) -> list[str]:
+        compiled = stmt.compile(dialect=sqlite.dialect())
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+        async with self.engine.connect() as conn:
+            result = await conn.exec_driver_sql(
+                f"EXPLAIN QUERY PLAN {compiled}", params
+            )
+            return [row[-1] for row in result]
+
+    async def assertUsesIndex(self, stmt, index: str) -> None:
+        details = await self.plan(stmt)
+        self.assertTrue(
+            any(f"USING INDEX {index}" in d for d in details),
+            f"{index} is not used: {details}",
+        )
+        self.assertFalse(
+            any(d.startswith("SCAN") for d in details), f"full scan: {details}"
+        )
+
+    async def test_kept_archive_time(self) -> None:
+        stmt = (
+            select(ChannelDataDB)
+            .where(ChannelDataDB.keep)
+            .where(ChannelDataDB.archive_time < datetime.now() + timedelta(hours=24))
+            .order_by(ChannelDataDB.archive_time)
+        )
+        await self.assertUsesIndex(stmt, "ix_channel_setting_kept_archive_time")
+
+    async def test_channel_setting_by_guild(self) -> None:
+        stmt = select(ChannelDataDB).where(ChannelDataDB.guild_id == 1)
+        await self.assertUsesIndex(stmt, "ix_channel_setting_guild_id")
+
+    async def test_thread_activity_by_guild(self) -> None:
+        stmt = select(ThreadActivityDB).where(ThreadActivityDB.guild_id == 1)
+        await self.assertUsesIndex(stmt, "ix_thread_activity_guild_id")
+
+    async def test_due_closures(self) -> None:
+        stmt = (
+            select(ScheduledClosureDB)
+            .where(ScheduledClosureDB.scheduled_close_time <= datetime.now())
+            .order_by(ScheduledClosureDB.scheduled_close_time)
+        )
+        await self.assertUsesIndex(stmt, "ix_scheduled_closures_scheduled_close_time")
+
+    async def test_exclusions_by_guild(self) -> None:
+        stmt = select(ReminderExclusionDB).where(ReminderExclusionDB.guild_id == 1)
+        await self.assertUsesIndex(stmt, "ix_reminder_exclusions_guild_id")
+
+
+if __name__ == "__main__":
+    unittest.main()